@@ -0,0 +1,71 @@
+from argparse import ArgumentParser
+from json import dumps
+from timeit import timeit
+
+from Xlib.ext.randr import extname, GetCrtcInfo
+
+from randrer.randr_adapter import RandrAdapter
+
+
+class NullProtocolDisplay:
+    def __init__(self):
+        self.serial = 0
+
+    def get_extension_major(self, name: str) -> int:
+        return {extname: 140}[name]
+
+    def send_request(self, request, wait_for_response):
+        self.serial += 1
+        request._serial = self.serial
+
+
+class NullRoot:
+    def __init__(self, display: NullProtocolDisplay):
+        self.display = display
+
+
+class NullScreen:
+    def __init__(self, display: NullProtocolDisplay):
+        self.root = NullRoot(display)
+
+
+class NullDisplay:
+    def __init__(self):
+        self.display = NullProtocolDisplay()
+
+    def screen(self):
+        return NullScreen(self.display)
+
+
+def uncached_request(adapter: RandrAdapter, crtc_id: int):
+    return GetCrtcInfo(
+        display=adapter.window.display,
+        defer=True,
+        opcode=adapter.window.display.get_extension_major(adapter.extension_name),
+        crtc=crtc_id,
+        config_timestamp=0
+    )
+
+
+def main():
+    parser = ArgumentParser(
+        prog='python -m benchmarks.adapter_overhead',
+        description='Measure the Python overhead of building and queueing a RandR request.'
+    )
+    parser.add_argument('-n', '--number', default=100000, type=int)
+    namespace = parser.parse_args()
+    number = namespace.number
+    adapter = RandrAdapter(NullDisplay())
+    results = {
+        'uncached_us': timeit(lambda: uncached_request(adapter, 63), number=number) / number * 1e6,
+        'get_crtc_info_us': timeit(lambda: adapter.get_crtc_info(63, defer=True), number=number) / number * 1e6,
+        'request_us': timeit(
+            lambda: adapter.request(GetCrtcInfo, defer=True, crtc=63, config_timestamp=0),
+            number=number
+        ) / number * 1e6,
+    }
+    print(dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from argparse import ArgumentParser
+from json import dumps
+from os import environ
+from statistics import median
+from subprocess import run, DEVNULL
+from sys import executable
+from time import perf_counter
+from typing import List, Optional
+
+
+def measure(arguments: List[str], repeat: int) -> Optional[float]:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        completed = run([executable, '-m', 'randrer.client.client', *arguments], stdout=DEVNULL, stderr=DEVNULL)
+        timings.append(perf_counter() - start)
+        if completed.returncode != 0:
+            return None
+    return median(timings) * 1000
+
+
+def main():
+    parser = ArgumentParser(
+        prog='python -m benchmarks.startup',
+        description='Measure the cold start latency of the randrer command line interface.'
+    )
+    parser.add_argument('location', help='The configuration file used by the apply benchmarks.')
+    parser.add_argument('-n', '--repeat', default=20, type=int)
+    namespace = parser.parse_args()
+    location = namespace.location
+    repeat = namespace.repeat
+    results = {
+        'help_ms': measure(['--help'], repeat),
+        'apply_test_ms': measure(['apply', '--test', location], repeat),
+        'apply_ms': measure(['apply', location], repeat) if environ.get('DISPLAY') else None,
+    }
+    print(dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+from argparse import ArgumentParser
+from json import dumps
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict
+
+from yaml import safe_dump
+
+from randrer.config import Configuration
+from randrer.fake_adapter import FakeRandrAdapter, FakeTopology
+from randrer.screen import ScreenManager
+
+
+def write_config(directory: str, topology: FakeTopology) -> str:
+    outputs = {
+        output.name: {
+            'type': output.name.split('-')[0],
+            'number': int(output.name.split('-')[1]),
+            'use_preferred': True
+        }
+        for output in topology.outputs.values()
+    }
+    location = join(directory, f'randrer-{len(outputs)}.yaml')
+    with open(location, 'w') as file_handle:
+        safe_dump({'layout': {'type': 'linear', 'arrangements': list(outputs)}, 'outputs': outputs}, file_handle)
+    return location
+
+
+def measure(adapter: FakeRandrAdapter, operation) -> Dict:
+    statistics = adapter.statistics
+    round_trips, requests, modesets = statistics.round_trips, statistics.request_count, statistics.modesets
+    start = perf_counter()
+    result = operation()
+    return {
+        'ms': (perf_counter() - start) * 1000,
+        'round_trips': statistics.round_trips - round_trips,
+        'requests': statistics.request_count - requests,
+        'modesets': statistics.modesets - modesets,
+    }, result
+
+
+def run(directory: str, output_count: int, latency: float, modeset_latency: float) -> Dict:
+    topology = FakeTopology.generate(output_count)
+    adapter = FakeRandrAdapter(topology, latency, modeset_latency)
+    config = Configuration(write_config(directory, topology), use_cache=False)
+    discovery, screen_manager = measure(adapter, lambda: ScreenManager(adapter, config))
+    layout = screen_manager.get_layout(list(screen_manager.get_connected_outputs()), screen_manager.crtcs)
+    arrangement, _ = measure(adapter, layout.arrange)
+    planning, plan = measure(adapter, lambda: screen_manager.get_plan(layout))
+    commit, _ = measure(adapter, lambda: screen_manager.commit(plan))
+    reapply, _ = measure(adapter, lambda: ScreenManager(adapter, config).apply_config())
+    return {
+        'outputs': output_count,
+        'discovery': discovery,
+        'layout': arrangement,
+        'plan': planning,
+        'commit': commit,
+        'reapply': reapply,
+    }
+
+
+def main():
+    parser = ArgumentParser(
+        prog='python -m benchmarks.topology',
+        description='Benchmark discovery, layout and commit against synthetic topologies.'
+    )
+    parser.add_argument('-l', '--latency', default=0.0, type=float, help='Simulated round trip latency in seconds.')
+    parser.add_argument('-m', '--modeset-latency', default=0.0, type=float, help='Simulated modeset duration.')
+    parser.add_argument('-o', '--outputs', default='1,2,4,8,16,32,64', help='Comma separated output counts.')
+    namespace = parser.parse_args()
+    with TemporaryDirectory() as directory:
+        for output_count in [int(count) for count in namespace.outputs.split(',')]:
+            print(dumps(run(directory, output_count, namespace.latency, namespace.modeset_latency)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+from asyncio import AbstractEventLoop, Future, Queue, gather, get_running_loop
+from time import perf_counter, time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from Xlib.ext.randr import GetCrtcInfo, GetOutputInfo, GetScreenResources, GetScreenResourcesCurrent, \
+    RRScreenChangeNotifyMask, RRCrtcChangeNotifyMask, RROutputChangeNotifyMask, RROutputPropertyNotifyMask, \
+    SetConfigInvalidConfigTime, SetCrtcConfig
+from Xlib.protocol.rq import ReplyRequest
+
+from randrer.config import Configuration
+from randrer.layout_cache import LayoutCache
+from randrer.lid import LidStateProvider
+from randrer.plan import CommitPlan, CommitPlanner, CommitResult, CrtcChange, ScreenSize
+from randrer.randr_adapter import RandrAdapter
+from randrer.snapshot import ScreenSnapshot
+from randrer.screen import ScreenManager
+
+
+class AsyncRandrAdapter:
+    _adapter: RandrAdapter
+    _event_mask: int
+    _fd: int
+    _loop: Optional[AbstractEventLoop]
+    _subscribers: List[Queue]
+    _waiters: List[Future]
+
+    def __init__(self, adapter: RandrAdapter):
+        self._adapter = adapter
+        self._event_mask = 0
+        self._fd = adapter.fileno()
+        self._loop = None
+        self._subscribers = []
+        self._waiters = []
+
+    @property
+    def adapter(self) -> RandrAdapter:
+        return self._adapter
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+
+    async def commit(self, plan: CommitPlan) -> CommitResult:
+        adapter = self._adapter
+        crtc_changes = plan.crtc_changes
+        results = {}
+        indices = None
+        for _ in range(adapter.config_retries + 1):
+            replies = adapter.queue_commit(plan, indices)
+            await gather(*(self.wait(reply) for reply in replies.values()))
+            results.update(
+                {index: adapter.get_crtc_result(crtc_changes[index], reply) for index, reply in replies.items()}
+            )
+            indices = [index for index, result in results.items() if result.status == SetConfigInvalidConfigTime]
+            if not indices:
+                break
+            await self.get_screen_resources_current()
+        return CommitResult(plan, [results[index] for index in sorted(results)])
+
+    async def events(self, mask: int) -> AsyncIterator:
+        adapter = self._adapter
+        if mask & ~self._event_mask:
+            self._event_mask |= mask
+            adapter.select_input(self._event_mask)
+            adapter.display.flush()
+        self._listen()
+        queue = Queue()
+        self._subscribers.append(queue)
+        try:
+            # Earlier blocking calls may have read events off the socket already, those never wake the reader.
+            self._dispatch_events()
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+
+    async def get_crtc_info(self, crtc_id: int) -> GetCrtcInfo:
+        return await self.receive(self._adapter.get_crtc_info(crtc_id, defer=True))
+
+    async def get_geometry(self):
+        return await self.receive(self._adapter.get_geometry(defer=True))
+
+    async def get_output_info(self, output_id: int) -> GetOutputInfo:
+        return await self.receive(self._adapter.get_output_info(output_id, defer=True))
+
+    async def get_resource_infos(
+            self,
+            crtc_ids: Iterable[int],
+            output_ids: Iterable[int]
+    ) -> Tuple[Dict[int, GetCrtcInfo], Dict[int, GetOutputInfo]]:
+        crtc_ids = list(crtc_ids)
+        output_ids = list(output_ids)
+        infos = await gather(
+            *(self.get_crtc_info(crtc_id) for crtc_id in crtc_ids),
+            *(self.get_output_info(output_id) for output_id in output_ids)
+        )
+        return dict(zip(crtc_ids, infos[:len(crtc_ids)])), dict(zip(output_ids, infos[len(crtc_ids):]))
+
+    async def get_screen_resources(self) -> GetScreenResources:
+        adapter = self._adapter
+        resources = await self.receive(adapter.request(GetScreenResources, defer=True, window=adapter.window))
+        adapter.config_timestamp = resources.config_timestamp
+        return resources
+
+    async def get_screen_resources_current(self) -> GetScreenResourcesCurrent:
+        adapter = self._adapter
+        resources = await self.receive(adapter.request(GetScreenResourcesCurrent, defer=True, window=adapter.window))
+        adapter.config_timestamp = resources.config_timestamp
+        return resources
+
+    async def receive(self, reply: ReplyRequest) -> ReplyRequest:
+        await self.wait(reply)
+        reply.reply()
+        return reply
+
+    async def set_crtc_config(
+            self,
+            crtc_id: int,
+            x: int,
+            y: int,
+            mode: int,
+            rotation: int,
+            outputs: List[int]
+    ) -> SetCrtcConfig:
+        adapter = self._adapter
+        reply = None
+        for _ in range(adapter.config_retries + 1):
+            reply = await self.receive(
+                adapter.request(
+                    SetCrtcConfig,
+                    defer=True,
+                    crtc=crtc_id,
+                    config_timestamp=adapter.config_timestamp,
+                    x=x,
+                    y=y,
+                    mode=mode,
+                    rotation=rotation,
+                    outputs=outputs,
+                    timestamp=int(time())
+                )
+            )
+            if reply.status != SetConfigInvalidConfigTime:
+                break
+            await self.get_screen_resources_current()
+        return reply
+
+    async def wait(self, reply: ReplyRequest):
+        adapter = self._adapter
+        adapter.display.flush()
+        self._listen()
+        while not adapter.is_replied(reply):
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    def _dispatch_events(self):
+        display = self._adapter.display
+        for _ in range(self._adapter.receive_pending()):
+            event = display.next_event()
+            for queue in self._subscribers:
+                queue.put_nowait(event)
+
+    def _listen(self):
+        if self._loop is None:
+            self._loop = get_running_loop()
+            self._loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self):
+        self._dispatch_events()
+        waiters = self._waiters
+        self._waiters = []
+        for waiter in waiters:
+            waiter.done() or waiter.set_result(None)
+
+
+class AsyncScreenManager(ScreenManager):
+    _async_adapter: AsyncRandrAdapter
+
+    def __init__(
+            self,
+            adapter: AsyncRandrAdapter,
+            config: Configuration,
+            lid_state: LidStateProvider = None,
+            layout_cache: LayoutCache = None
+    ):
+        # Discovery waits for replies, it runs in create() once the manager can be awaited.
+        super().__init__(adapter.adapter, config, lid_state=lid_state, layout_cache=layout_cache, discover=False)
+        self._async_adapter = adapter
+
+    @classmethod
+    async def create(
+            cls,
+            adapter: AsyncRandrAdapter,
+            config: Configuration,
+            probe: bool = False,
+            lid_state: LidStateProvider = None,
+            layout_cache: LayoutCache = None
+    ):
+        screen_manager = cls(adapter, config, lid_state, layout_cache)
+        await screen_manager.refresh(probe)
+        return screen_manager
+
+    @property
+    def async_adapter(self) -> AsyncRandrAdapter:
+        return self._async_adapter
+
+    async def apply_config(self, grab: bool = False) -> CommitPlan:
+        if self._needs_probe():
+            await self._discover(probe=True)
+        plan = self._plan_config()
+        try:
+            if grab:
+                plan = await self._commit_with_grab(plan)
+            else:
+                await self.commit(plan)
+        except ValueError:
+            self._forget_pending_layout()
+            raise
+        self._restore_plan = self._get_restore_plan(plan)
+        self._remember_layout()
+        return plan
+
+    async def commit(self, plan: CommitPlan, rollback: bool = True) -> CommitResult:
+        self._baseline = self.crtcs, self.screen_size
+        with self._phase('commit'):
+            result = await self.async_adapter.commit(plan)
+            rollback_plan = self._get_rollback_plan(result) if rollback else None
+            rollback_result = await self.async_adapter.commit(rollback_plan) if rollback_plan is not None else None
+        self._track_commit(result, rollback_result)
+        self._check_commit(result, rollback_plan)
+        return result
+
+    async def events(
+            self,
+            mask: int = RRScreenChangeNotifyMask | RRCrtcChangeNotifyMask | RROutputChangeNotifyMask |
+            RROutputPropertyNotifyMask
+    ) -> AsyncIterator:
+        async for event in self.async_adapter.events(mask):
+            self.handle_event(event)
+            yield event
+
+    async def refresh(self, probe: bool = False):
+        await self._discover(probe)
+
+    async def reset(self):
+        self._forget_layout()
+        restore_plan = self._restore_plan
+        if restore_plan is not None:
+            await self.commit(restore_plan, rollback=False)
+            self._restore_plan = None
+        else:
+            await self.restore(self._get_baseline_snapshot())
+
+    async def restore(self, snapshot: ScreenSnapshot):
+        async_adapter = self.async_adapter
+        with self._phase('discovery'):
+            resources, geometry = await gather(
+                async_adapter.get_screen_resources_current(),
+                async_adapter.get_geometry()
+            )
+            crtc_infos, _ = await async_adapter.get_resource_infos(resources.crtcs, ())
+            crtcs = dict(self._parse_crtcs(crtc_infos))
+            screen_size = ScreenSize(geometry.width, geometry.height, *self.adapter.screen_size_mm)
+        self._available_modes = dict(self._parse_modes(resources.modes, resources.mode_names))
+        self._crtcs, self._screen_size = crtcs, screen_size
+        targets = [CrtcChange.from_crtc(crtc) for crtc in snapshot.crtcs]
+        await self.commit(CommitPlanner(crtcs, screen_size).plan(targets, snapshot.screen_size), rollback=False)
+
+    async def _commit_with_grab(self, plan: CommitPlan) -> CommitPlan:
+        display = self.adapter.display
+        start = perf_counter()
+        display.grab_server()
+        try:
+            with self._phase('grab'):
+                resources = await self.async_adapter.get_screen_resources_current()
+                if (resources.config_timestamp, resources.timestamp) != (self._config_timestamp, self._timestamp):
+                    await self._discover(probe=False)
+                    plan = self._plan_config()
+                await self.commit(plan)
+        finally:
+            display.ungrab_server()
+            display.flush()
+            self._grab_duration = perf_counter() - start
+        return plan
+
+    async def _discover(self, probe: bool):
+        async_adapter = self.async_adapter
+        with self._phase('discovery'):
+            get_resources = async_adapter.get_screen_resources if probe \
+                else async_adapter.get_screen_resources_current
+            resources, geometry = await gather(get_resources(), async_adapter.get_geometry())
+            properties = self._request_properties(resources.outputs)
+            (crtc_infos, output_infos), *_ = await gather(
+                async_adapter.get_resource_infos(resources.crtcs, resources.outputs),
+                *(async_adapter.receive(reply) for reply in properties.values())
+            )
+            self._properties.store(properties)
+            self._load(resources, crtc_infos, output_infos, geometry, probe)
@@ -1,12 +1,15 @@
 from argparse import ArgumentParser
+from os import environ
 from sys import argv
 from typing import Tuple, Dict
 
-from Xlib.display import Display
-
-from randrer.client.commands import CommandInterface, ApplyCommand, GetOutputsCommand
+from randrer.client.commands import CommandInterface, ApplyCommand, GetOutputsCommand, DaemonCommand, \
+    RestoreCommand, ConfirmCommand, RevertCommand, PlanCommand, ServeCommand
+from randrer.client.connection import DisplayConnection
 from randrer.client.operations import ConfigLoadingOperation, ConfigApplicationOperation, ConfigResetOperation, \
-    PrintOutputsOperation
+    PrintOutputsOperation, DaemonOperation, RestoreOperation, OperationInterface, ProfilingOperation, \
+    ConfirmationSendingOperation, DisplaySelectionOperation, PlanOperation, ServeOperation, \
+    ServiceForwardingOperation, ForwardedCommandCheckingOperation
 
 
 class Client:
@@ -15,11 +18,13 @@ class Client:
             self,
             global_options: Tuple[Dict, ...],
             commands: Tuple[CommandInterface, ...],
-            parser: ArgumentParser
+            parser: ArgumentParser,
+            global_operations: Tuple[OperationInterface, ...] = ()
     ):
         self.global_options = global_options
         self.commands: Tuple[CommandInterface, ...] = commands
         self.parser: ArgumentParser = parser
+        self.global_operations: Tuple[OperationInterface, ...] = global_operations
 
     def run(self, *args):
         try:
@@ -31,6 +36,9 @@ class Client:
         self._set_global_options()
         self._set_commands()
         namespace = self.parser.parse_args(*args)
+        namespace.arguments = list(args[0]) if args else argv[1:]
+        for operation in self.global_operations:
+            operation.perform(namespace)
         command: CommandInterface = namespace.command
         command.execute(namespace)
 
@@ -56,19 +64,74 @@ class Client:
             self.parser.add_argument(*option.get('args'), **option.get('kwargs'))
 
 
-def main():
-    Client(
-        (),
+def create_client(connection: DisplayConnection, use_service: bool = True, is_forwarded: bool = False) -> Client:
+    global_operations = (DisplaySelectionOperation(connection), ProfilingOperation(connection))
+    if is_forwarded:
+        global_operations = (ForwardedCommandCheckingOperation(connection), *global_operations)
+    return Client(
+        (
+            {
+                'args': ('--display',),
+                'kwargs': {
+                    'default': None,
+                    'dest': 'display',
+                    'help': 'The X display and screen to configure, such as :1 or :0.1. Defaults to $DISPLAY.',
+                    'type': str
+                }
+            },
+            {
+                'args': ('--profile',),
+                'kwargs': {
+                    'action': 'store_true',
+                    'default': environ.get('RANDRER_PROFILE', '') not in ('', '0'),
+                    'dest': 'profile',
+                    'help': 'Print a summary of every X request made, per request type, when the command exits. May '
+                            'also be enabled with RANDRER_PROFILE=1.'
+                }
+            },
+            {
+                'args': ('--trace',),
+                'kwargs': {
+                    'default': environ.get('RANDRER_TRACE'),
+                    'dest': 'trace',
+                    'help': 'Write a Chrome trace event file of the X requests and the discovery, layout and commit '
+                            'phases to this location when the command exits. May also be set with RANDRER_TRACE.',
+                    'type': str
+                }
+            },
+            {
+                'args': ('--no-service',),
+                'kwargs': {
+                    'action': 'store_false',
+                    'default': environ.get('RANDRER_NO_SERVICE', '') in ('', '0'),
+                    'dest': 'use_service',
+                    'help': 'Run the command in this process even if randrer serve is running. May also be set with '
+                            'RANDRER_NO_SERVICE=1.'
+                }
+            }
+        ),
         (
             ApplyCommand(
                 ConfigLoadingOperation(),
-                ConfigApplicationOperation(Display()),
-                ConfigResetOperation()
+                ConfigApplicationOperation(connection),
+                ConfigResetOperation(),
+                ConfigResetOperation(False)
             ),
-            GetOutputsCommand(PrintOutputsOperation(Display()))
+            GetOutputsCommand(PrintOutputsOperation(connection)),
+            DaemonCommand(ConfigLoadingOperation(), DaemonOperation(connection)),
+            PlanCommand(PlanOperation(connection)),
+            RestoreCommand(RestoreOperation(connection)),
+            ServeCommand(ServeOperation(connection)),
+            ConfirmCommand(ConfirmationSendingOperation('confirm')),
+            RevertCommand(ConfirmationSendingOperation('revert'))
         ),
-        ArgumentParser()
-    ).run(argv[1:])
+        ArgumentParser(),
+        (ServiceForwardingOperation(), *global_operations) if use_service else global_operations
+    )
+
+
+def main():
+    create_client(DisplayConnection()).run(argv[1:])
 
 
 if __name__ == '__main__':
@@ -9,6 +9,9 @@ class CommandInterface(ABC):
     def execute(self, namespace: Namespace):
         raise NotImplemented
 
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        return False
+
 
 class ApplyCommand(CommandInterface):
     help = 'Apply a configuration.'
@@ -29,8 +32,18 @@ class ApplyCommand(CommandInterface):
             'kwargs': {
                 'action': 'store_true',
                 'dest': 'reset',
-                'help': 'After applying the configuration, reset to the previous settings after a fifteen second '
-                        'timeout.'
+                'help': 'After applying the configuration, reset to the previous settings unless it is confirmed '
+                        'before the timeout, either with a keypress, with randrer confirm or with SIGUSR1. randrer '
+                        'revert, SIGUSR2 or any other key resets immediately.'
+            }
+        },
+        {
+            'args': ('-T', '--timeout'),
+            'kwargs': {
+                'default': 15.0,
+                'dest': 'timeout',
+                'help': 'The number of seconds to wait for confirmation when --reset is used. Defaults to 15.',
+                'type': float
             }
         },
         {
@@ -49,6 +62,15 @@ class ApplyCommand(CommandInterface):
                 'help': 'By default, changes made by the configuration will be reset if there is an error. Use this '
                         'option to override that behavior.'
             }
+        },
+        {
+            'args': ('-p', '--probe'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'probe',
+                'help': 'Force the X server to probe the hardware for outputs instead of using its current '
+                        'configuration.'
+            }
         }
     )
 
@@ -56,11 +78,13 @@ class ApplyCommand(CommandInterface):
             self,
             config_loader: OperationInterface,
             config_applier: OperationInterface,
-            config_reseter: OperationInterface
+            config_reseter: OperationInterface,
+            config_reverter: OperationInterface
     ):
         self.config_loader = config_loader
         self.config_applier = config_applier
         self.config_reseter = config_reseter
+        self.config_reverter = config_reverter
 
     def execute(self, namespace: Namespace):
         try:
@@ -68,19 +92,270 @@ class ApplyCommand(CommandInterface):
             if namespace.test is not True:
                 self.config_applier.perform(namespace)
                 namespace.reset is True and self.config_reseter.perform(namespace)
-        except (ValueError, KeyError, FileNotFoundError) as e:
+        except Exception as e:
             print(e)
-            namespace.reset_on_error and hasattr(namespace, 'screen_manager') and self.config_reseter.perform(namespace)
+            if namespace.reset_on_error and hasattr(namespace, 'screen_manager'):
+                self.config_reverter.perform(namespace)
+
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        # Waiting for confirmation reads the caller's terminal, which the service has no access to.
+        return not namespace.reset
 
 
 class GetOutputsCommand(CommandInterface):
     help = 'Get the names of the outputs currently connected.'
     name = 'get-outputs'
-    options = ()
+    options = (
+        {
+            'args': ('-p', '--probe'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'probe',
+                'help': 'Force the X server to probe the hardware for outputs instead of using its current '
+                        'configuration.'
+            }
+        },
+        {
+            'args': ('-a', '--all'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'all',
+                'help': 'List every output, including the disconnected and inactive ones.'
+            }
+        },
+        {
+            'args': ('-f', '--fields'),
+            'kwargs': {
+                'default': 'name',
+                'dest': 'fields',
+                'help': 'A comma separated selection of name, connection, mode, position, refresh and edid. Only the '
+                        'requests these fields need are sent. Defaults to name.',
+                'type': str
+            }
+        },
+        {
+            'args': ('-j', '--json'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'json',
+                'help': 'Print the outputs as a JSON list of objects instead of tab separated lines.'
+            }
+        },
+        {
+            'args': ('-c', '--cached'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'cached',
+                'help': 'Answer from the screen resources kept by a running daemon, if there are any, without '
+                        'querying the X server.'
+            }
+        }
+    )
 
     def __init__(self, output_printer: OperationInterface):
         self._output_printer = output_printer
 
     def execute(self, namespace: Namespace):
-        self._output_printer.perform(namespace)
+        try:
+            self._output_printer.perform(namespace)
+        except ValueError as e:
+            print(e)
+            exit(1)
+
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        return True
+
+
+class ConfirmCommand(CommandInterface):
+    help = 'Keep a configuration applied with apply --reset that is waiting for confirmation.'
+    name = 'confirm'
+    options = ()
+
+    def __init__(self, confirmation_sender: OperationInterface):
+        self._confirmation_sender = confirmation_sender
+
+    def execute(self, namespace: Namespace):
+        try:
+            self._confirmation_sender.perform(namespace)
+        except FileNotFoundError as e:
+            print(e)
+
+
+class RevertCommand(CommandInterface):
+    help = 'Immediately reset a configuration applied with apply --reset that is waiting for confirmation.'
+    name = 'revert'
+    options = ()
+
+    def __init__(self, revert_sender: OperationInterface):
+        self._revert_sender = revert_sender
+
+    def execute(self, namespace: Namespace):
+        try:
+            self._revert_sender.perform(namespace)
+        except FileNotFoundError as e:
+            print(e)
+
+
+class PlanCommand(CommandInterface):
+    help = 'Print the requests applying a configuration would send, without changing the screen configuration.'
+    name = 'plan'
+    options = (
+        {
+            'args': ('locations',),
+            'kwargs': {
+                'help': 'The locations of the configuration files that should be planned. If no location is given, '
+                        'then ~/.config/randrer/randrer.config is used.',
+                'nargs': '*',
+                'type': str
+            }
+        },
+        {
+            'args': ('-r', '--resources'),
+            'kwargs': {
+                'default': None,
+                'dest': 'resources',
+                'help': 'Plan against the screen resources recorded in this file instead of the X server. No display '
+                        'connection is made.',
+                'type': str
+            }
+        },
+        {
+            'args': ('--record',),
+            'kwargs': {
+                'default': None,
+                'dest': 'record',
+                'help': 'Record the screen resources that are planned against to this file, for use with '
+                        '--resources.',
+                'type': str
+            }
+        },
+        {
+            'args': ('-p', '--probe'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'probe',
+                'help': 'Force the X server to probe the hardware for outputs instead of using its current '
+                        'configuration.'
+            }
+        }
+    )
+
+    def __init__(self, planner: OperationInterface):
+        self._planner = planner
+
+    def execute(self, namespace: Namespace):
+        try:
+            self._planner.perform(namespace)
+        except (ValueError, KeyError, FileNotFoundError) as e:
+            print(e)
+            exit(1)
+        namespace.failures and exit(1)
+
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        return True
+
+
+class RestoreCommand(CommandInterface):
+    help = 'Restore the screen configuration saved before the last configuration was applied.'
+    name = 'restore'
+    options = (
+        {
+            'args': ('snapshot',),
+            'kwargs': {
+                'default': None,
+                'help': 'The location of a snapshot that should be restored. If snapshot is not given, then '
+                        '$XDG_STATE_HOME/randrer/snapshot.json is used.',
+                'nargs': '?',
+                'type': str
+            }
+        },
+        {
+            'args': ('-D', '--discover'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'discover',
+                'help': 'Compare the snapshot against the current screen configuration instead of replaying the '
+                        'requests recorded with it.'
+            }
+        }
+    )
+
+    def __init__(self, snapshot_restorer: OperationInterface):
+        self._snapshot_restorer = snapshot_restorer
+
+    def execute(self, namespace: Namespace):
+        try:
+            self._snapshot_restorer.perform(namespace)
+        except (ValueError, KeyError, FileNotFoundError) as e:
+            print(e)
+
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        return True
+
+
+class ServeCommand(CommandInterface):
+    help = 'Keep a connection to the X server open and run apply, get-outputs, plan and restore for other randrer ' \
+           'invocations, which forward to it while it runs.'
+    name = 'serve'
+    options = ()
+
+    def __init__(self, service_runner: OperationInterface):
+        self._service_runner = service_runner
+
+    def execute(self, namespace: Namespace):
+        self._service_runner.perform(namespace)
+
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        # The service would block on a nested service for good.
+        return False
+
+
+class DaemonCommand(CommandInterface):
+    help = 'Apply a configuration and reapply it whenever outputs are connected or disconnected.'
+    name = 'daemon'
+    options = (
+        {
+            'args': ('location',),
+            'kwargs': {
+                'default': None,
+                'help': 'The location of a configuration file that should be applied. If location is not given, then '
+                        '~/.config/randrer/randrer.config is used.',
+                'nargs': '?',
+                'type': str
+            }
+        },
+        {
+            'args': ('-b', '--debounce'),
+            'kwargs': {
+                'default': 50,
+                'dest': 'debounce',
+                'help': 'The number of milliseconds without RandR events to wait for before reapplying the '
+                        'configuration. Defaults to 50.',
+                'type': int
+            }
+        },
+        {
+            'args': ('-p', '--probe'),
+            'kwargs': {
+                'action': 'store_true',
+                'dest': 'probe',
+                'help': 'Force the X server to probe the hardware for outputs on startup instead of using its current '
+                        'configuration.'
+            }
+        }
+    )
+
+    def __init__(self, config_loader: OperationInterface, daemon_runner: OperationInterface):
+        self.config_loader = config_loader
+        self.daemon_runner = daemon_runner
+
+    def execute(self, namespace: Namespace):
+        try:
+            self.config_loader.perform(namespace)
+            self.daemon_runner.perform(namespace)
+        except (ValueError, KeyError, FileNotFoundError) as e:
+            print(e)
 
+    def is_forwardable(self, namespace: Namespace) -> bool:
+        # A daemon runs until it is stopped, the service would answer no other request meanwhile.
+        return False
@@ -0,0 +1,61 @@
+from typing import Optional, TYPE_CHECKING
+
+from randrer.paths import get_display_key
+
+if TYPE_CHECKING:
+    from Xlib.display import Display
+
+    from randrer.profiler import RequestProfiler
+    from randrer.randr_adapter import RandrAdapter
+    from randrer.screen import ScreenManager
+
+
+class DisplayConnection:
+    profiler: Optional['RequestProfiler']
+    screen_manager: Optional['ScreenManager']
+    _adapter: Optional['RandrAdapter']
+    _display: Optional['Display']
+    _name: Optional[str]
+
+    def __init__(self, name: str = None):
+        self.profiler = None
+        self.screen_manager = None
+        self._adapter = None
+        self._display = None
+        self._name = name
+
+    @property
+    def adapter(self) -> 'RandrAdapter':
+        if self._adapter is None:
+            from randrer.randr_adapter import RandrAdapter
+            self._adapter = RandrAdapter(self.display)
+            self.profiler is not None and self.profiler.attach(self._adapter)
+        return self._adapter
+
+    @property
+    def display(self) -> 'Display':
+        if self._display is None:
+            from Xlib.display import Display
+            self._display = Display(self._name)
+        return self._display
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._name
+
+    @name.setter
+    def name(self, name: Optional[str]):
+        if self._display is None:
+            self._name = name
+        elif get_display_key(name) != get_display_key(self._name):
+            raise ValueError('The display can not be changed once it is open')
+
+    @property
+    def is_open(self) -> bool:
+        return self._display is not None
+
+    def close(self):
+        if self._display is not None:
+            self._display.close()
+        self._adapter = None
+        self._display = None
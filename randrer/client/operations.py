@@ -1,13 +1,16 @@
 from abc import ABC, abstractmethod
 from argparse import Namespace
+from atexit import register
 from logging import getLogger
-from time import sleep
+import sys
+from typing import List, Optional, TYPE_CHECKING
 
-from Xlib.display import Display
+from randrer.client.connection import DisplayConnection
 
-from randrer.config import Configuration
-from randrer.randr_adapter import RandrAdapter
-from randrer.screen import ScreenManager
+if TYPE_CHECKING:
+    from randrer.config import Configuration
+    from randrer.query import OutputStatus
+    from randrer.screen import ScreenManager
 
 
 class OperationInterface(ABC):
@@ -18,51 +21,327 @@ class OperationInterface(ABC):
 
 class ConfigLoadingOperation(OperationInterface):
     def perform(self, namespace: Namespace):
+        from randrer.config import Configuration
         location = namespace.location
         config = Configuration(location)
         namespace.config = config
 
 
 class ConfigApplicationOperation(OperationInterface):
-    def __init__(self, display: Display):
-        self._display = display
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
 
     def perform(self, namespace: Namespace):
-        config: Configuration = namespace.config if hasattr(namespace, 'config') else None
+        from randrer.config import Configuration
+        config: 'Configuration' = namespace.config if hasattr(namespace, 'config') else None
         if config is None or not isinstance(config, Configuration):
             raise ValueError(f'config must be of type {Configuration.__module__}.{Configuration.__qualname__}')
 
-        display = self._display
+        if config.displays:
+            self._apply_displays(namespace, config)
+            return
+        connection = self._connection
         try:
-            display.grab_server()
-            adapter = RandrAdapter(display)
-            screen_manager = ScreenManager(adapter, config)
-            namespace.screen_manager = screen_manager
-            screen_manager.apply_config()
+            screen_manager = self._get_screen_manager(connection, config, namespace.probe)
         except Exception as e:
             print(e)
+            return
+        # Known before the apply, so the apply command can reset a failed one to the state before it.
+        namespace.screen_manager = screen_manager
+        self._apply(connection, screen_manager)
+        layout_cache = screen_manager.layout_cache
+        namespace.profile and print(
+            f'layout cache {layout_cache.hits} hits {layout_cache.misses} misses',
+            file=sys.stderr
+        )
+
+    def _apply(self, connection: DisplayConnection, screen_manager: 'ScreenManager') -> 'ScreenManager':
+        from randrer.snapshot import SnapshotStore
+        snapshot_store = SnapshotStore(display=connection.name)
+        snapshot_store.save(screen_manager.get_snapshot())
+        try:
+            screen_manager.apply_config(grab=True)
         finally:
-            display.ungrab_server()
+            screen_manager.close()
+            if screen_manager is connection.screen_manager:
+                screen_manager.config = None
+        snapshot_store.save(screen_manager.get_snapshot())
+        return screen_manager
+
+    def _apply_display(self, display: str, config: 'Configuration', probe: bool) -> 'ScreenManager':
+        connection = DisplayConnection(display)
+        return self._apply(connection, self._get_screen_manager(connection, config, probe))
+
+    def _apply_displays(self, namespace: Namespace, config: 'Configuration'):
+        from randrer.displays import DisplayPool
+        results = DisplayPool().map(
+            lambda display, display_config: self._apply_display(display, display_config, namespace.probe),
+            config.displays
+        )
+        for result in results:
+            result.is_successful or print(f'{result.display}: {result.error}')
+        namespace.screen_managers = [result.value for result in results if result.is_successful]
+
+    def _get_screen_manager(
+            self,
+            connection: DisplayConnection,
+            config: 'Configuration',
+            probe: bool
+    ) -> 'ScreenManager':
+        from randrer.layout_cache import LayoutCache
+        from randrer.screen import ScreenManager
+        screen_manager = connection.screen_manager
+        if screen_manager is None:
+            layout_cache = LayoutCache(display=connection.name)
+            return ScreenManager(connection.adapter, config, probe, layout_cache=layout_cache)
+        # The service keeps the resources of its manager current, the config is only lent to it for this apply.
+        screen_manager.config = config
+        probe and screen_manager.refresh(probe=True)
+        return screen_manager
 
 
 class ConfigResetOperation(OperationInterface):
+    def __init__(self, wait_for_confirmation: bool = True):
+        self._wait_for_confirmation = wait_for_confirmation
+
     def perform(self, namespace: Namespace):
-        screen_manager: ScreenManager = namespace.screen_manager if hasattr(namespace, 'screen_manager') else None
-        if screen_manager is None or not isinstance(screen_manager, ScreenManager):
+        from randrer.screen import ScreenManager
+        screen_managers = namespace.screen_managers if hasattr(namespace, 'screen_managers') \
+            else [namespace.screen_manager] if hasattr(namespace, 'screen_manager') else None
+        if screen_managers is None or not all(isinstance(manager, ScreenManager) for manager in screen_managers):
             raise ValueError(f'screen_manager must be of type {ScreenManager.__module__}.{ScreenManager.__qualname__}')
 
-        sleep(15)
-        screen_manager.reset()
+        if self._wait_for_confirmation:
+            from randrer.confirm import ConfirmationWaiter, CONFIRMED, get_confirmation_socket_location
+            socket_location = get_confirmation_socket_location(namespace.display)
+            if ConfirmationWaiter(namespace.timeout, socket_location).wait() == CONFIRMED:
+                return
+        for screen_manager in screen_managers:
+            screen_manager.reset()
+
+
+class ConfirmationSendingOperation(OperationInterface):
+    def __init__(self, message: str):
+        self._message = message
+
+    def perform(self, namespace: Namespace):
+        from randrer.confirm import send_confirmation, get_confirmation_socket_location
+        send_confirmation(self._message, get_confirmation_socket_location(namespace.display))
+
+
+class DisplaySelectionOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        self._connection.name = namespace.display
+
+
+class ForwardedCommandCheckingOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        from randrer.paths import get_display_key
+        from randrer.service import RequestRefusedError
+        command = getattr(namespace, 'command', None)
+        if command is not None and not command.is_forwardable(namespace):
+            raise RequestRefusedError(f'{getattr(command, "name")} can not be run by randrer serve')
+        if get_display_key(namespace.display) != get_display_key(self._connection.name):
+            raise RequestRefusedError(f'randrer serve is not connected to the display {namespace.display}')
+
+
+class ServiceForwardingOperation(OperationInterface):
+    def perform(self, namespace: Namespace):
+        command = getattr(namespace, 'command', None)
+        if command is None or not command.is_forwardable(namespace) or not namespace.use_service:
+            return
+        # Profiles and traces describe the requests of this process, so those runs are never forwarded.
+        if namespace.profile or namespace.trace is not None:
+            return
+        from randrer.service import REFUSED, get_control_socket_location, send_request
+        try:
+            status, output, errors = send_request(namespace.arguments, get_control_socket_location(namespace.display))
+        except (FileNotFoundError, ConnectionRefusedError):
+            return
+        if status == REFUSED:
+            return
+        sys.stdout.write(output)
+        sys.stderr.write(errors)
+        exit(status)
+
+
+class ServeOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        from randrer.client.client import create_client
+        from randrer.service import ControlService
+        ControlService(
+            self._connection,
+            lambda connection: create_client(connection, use_service=False, is_forwarded=True)
+        ).run()
+
+
+class ProfilingOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        if not namespace.profile and namespace.trace is None:
+            return
+        from randrer.profiler import RequestProfiler
+        profiler = RequestProfiler()
+        self._connection.profiler = profiler
+        register(self._report, profiler, namespace.profile, namespace.trace)
+
+    def _report(self, profiler, profile: bool, trace: str):
+        profile and print(profiler.format_summary(), file=sys.stderr)
+        trace is not None and profiler.write_trace(trace)
 
 
 class PrintOutputsOperation(OperationInterface):
-    def __init__(self, display: Display):
-        self._display = display
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
 
     def perform(self, namespace: Namespace):
-        display = self._display
-        adapter = RandrAdapter(display)
-        screen_manager = ScreenManager(adapter, None)
-        namespace.screen_manager = screen_manager
-        for output in screen_manager.get_active_outputs():
-            print(output.name)
+        from json import dumps
+        from randrer.query import FIELDS, OutputQuery
+        fields = [field.strip() for field in namespace.fields.split(',') if field.strip()]
+        invalid_fields = [field for field in fields if field not in FIELDS]
+        if invalid_fields or not fields:
+            raise ValueError(f'Invalid fields {", ".join(invalid_fields)}, must be a selection of {", ".join(FIELDS)}')
+        statuses = self._get_cached(namespace, fields)
+        if statuses is None:
+            statuses = OutputQuery(self._connection.adapter).query(fields, namespace.probe)
+        if not namespace.all:
+            statuses = [status for status in statuses if status.is_active]
+        if namespace.json:
+            print(dumps([status.to_dict(fields) for status in statuses]))
+        else:
+            for status in statuses:
+                print(status.format(fields))
+
+    def _get_cached(self, namespace: Namespace, fields: List[str]) -> Optional[List['OutputStatus']]:
+        from randrer.query import OutputQuery
+        from randrer.snapshot import ResourceSnapshotStore, get_resource_snapshot_location
+        screen_manager = self._connection.screen_manager
+        if namespace.probe or (screen_manager is None and not namespace.cached):
+            return None
+        if screen_manager is not None:
+            snapshot = screen_manager.get_resource_snapshot()
+        else:
+            try:
+                snapshot = ResourceSnapshotStore(get_resource_snapshot_location(self._connection.name)).load()
+            except (FileNotFoundError, ValueError):
+                return None
+        statuses = OutputQuery.from_snapshot(snapshot)
+        # The daemon only identifies monitors when its config uses fingerprints.
+        if 'edid' in fields and any(status.connection == 'connected' and status.edid is None for status in statuses):
+            return None
+        return statuses
+
+
+class PlanOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        from randrer.config import Configuration
+        from randrer.dry_run import DryRun
+        from randrer.plan import ScreenSize
+        from randrer.snapshot import ResourceSnapshotStore
+        screen_manager = self._connection.screen_manager
+        if namespace.resources is not None:
+            resources = ResourceSnapshotStore(namespace.resources).load()
+        elif screen_manager is not None and not namespace.probe:
+            resources = screen_manager.get_resource_snapshot()
+        else:
+            from randrer.screen import ScreenManager
+            resources = ScreenManager(self._connection.adapter, None, namespace.probe).get_resource_snapshot()
+        namespace.record is not None and ResourceSnapshotStore(namespace.record).save(resources)
+        dry_run = DryRun(resources)
+        # Several modes share a name, the refresh rate and the id tell them apart.
+        modes = {mode.id: f'{mode.name}@{round(mode.refresh, 2)} ({mode.id:#x})' for mode in resources.modes}
+        outputs = {output.id: output.name for output in resources.outputs}
+        locations = namespace.locations or [None]
+        namespace.failures = 0
+        for location in locations:
+            try:
+                config = Configuration(location)
+                if config.displays:
+                    if namespace.display not in config.displays:
+                        raise ValueError(f'Select one of the displays {", ".join(config.displays)} with --display')
+                    config = config.displays[namespace.display]
+                result = dry_run.plan(config)
+            except (ValueError, KeyError, FileNotFoundError) as e:
+                namespace.failures += 1
+                print(f'{location}: {e}' if len(locations) > 1 else e)
+                continue
+            len(locations) > 1 and print(f'{location}:')
+            result.profile is not None and print(f'profile {result.profile}')
+            for request in result.plan.requests:
+                if isinstance(request, ScreenSize):
+                    print(
+                        f'SetScreenSize {request.width}x{request.height} {request.width_mm}x{request.height_mm}mm'
+                    )
+                elif request.is_disabled:
+                    print(f'SetCrtcConfig crtc={request.crtc} disabled')
+                else:
+                    print(
+                        f'SetCrtcConfig crtc={request.crtc} mode={modes.get(request.mode, f"{request.mode:#x}")} '
+                        f'x={request.x} y={request.y} rotation={request.rotation} '
+                        f'outputs={",".join(outputs.get(output, str(output)) for output in request.outputs)}'
+                    )
+            print(f'{result.modesets} modesets, {result.round_trips} round trips')
+
+
+class RestoreOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        from randrer.screen import ScreenManager
+        from randrer.snapshot import SnapshotStore
+        snapshot_store = SnapshotStore(namespace.snapshot, self._connection.name)
+        snapshot = snapshot_store.load()
+        adapter = self._connection.adapter
+        # Restoring discovers only the CRTCs, the outputs and their monitors are not needed. A manager shared by the
+        # service follows the commit, so it doesn't depend on the events of the restore having arrived.
+        screen_manager = self._connection.screen_manager or ScreenManager(adapter, None, discover=False)
+        if namespace.discover or snapshot.restore_plan is None:
+            screen_manager.restore(snapshot)
+        else:
+            adapter.config_timestamp = snapshot.config_timestamp
+            screen_manager.commit(snapshot.restore_plan, rollback=False)
+        snapshot_store.save(snapshot._replace(restore_plan=None))
+
+
+class DaemonOperation(OperationInterface):
+    def __init__(self, connection: DisplayConnection):
+        self._connection = connection
+
+    def perform(self, namespace: Namespace):
+        from randrer.config import Configuration
+        config: 'Configuration' = namespace.config if hasattr(namespace, 'config') else None
+        if config is None or not isinstance(config, Configuration):
+            raise ValueError(f'config must be of type {Configuration.__module__}.{Configuration.__qualname__}')
+
+        from randrer.daemon import HotplugDaemon
+        from randrer.layout_cache import LayoutCache
+        from randrer.lid import get_lid_state_provider
+        from randrer.snapshot import ResourceSnapshotStore, get_resource_snapshot_location
+        connection = self._connection
+        lid_state = get_lid_state_provider() if config.uses_lid_state else None
+        daemon = HotplugDaemon(
+            connection.adapter,
+            config,
+            namespace.debounce / 1000,
+            probe=namespace.probe,
+            lid_state=lid_state,
+            layout_cache=LayoutCache(display=connection.name),
+            resource_store=ResourceSnapshotStore(get_resource_snapshot_location(connection.name))
+        )
+        namespace.daemon = daemon
+        daemon.run()
@@ -1,40 +1,212 @@
+from hashlib import sha1
+from marshal import dumps, loads
+from os import environ, makedirs, replace, stat
+from os.path import realpath, dirname
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
 
-from yaml import safe_load
+from randrer.edid import EdidFingerprint
+
+
+class ConfigurationCache:
+    schema_version = 5
+
+    def __init__(self, cache_location: str = None):
+        cache_home = environ.get('XDG_CACHE_HOME') or f'{Path.home()}/.cache'
+        self._cache_location = cache_location or f'{cache_home}/randrer'
+
+    def load(self, config_location: str) -> Optional[Dict]:
+        key = self._get_key(config_location)
+        try:
+            with open(self._get_location(key), 'rb') as file_handle:
+                cached_key, config = loads(file_handle.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return config if cached_key == key else None
+
+    def save(self, config_location: str, config: Dict):
+        key = self._get_key(config_location)
+        location = self._get_location(key)
+        try:
+            data = dumps((key, config))
+            makedirs(dirname(location), exist_ok=True)
+            with open(f'{location}.tmp', 'wb') as file_handle:
+                file_handle.write(data)
+            replace(f'{location}.tmp', location)
+        except (OSError, ValueError):
+            pass
+
+    def _get_key(self, config_location: str) -> Tuple:
+        config_location = realpath(config_location)
+        try:
+            stat_result = stat(config_location)
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No configuration was found at {config_location}') from None
+        return self.schema_version, config_location, stat_result.st_mtime_ns, stat_result.st_size
+
+    def _get_location(self, key: Tuple) -> str:
+        return f'{self._cache_location}/{sha1(key[1].encode()).hexdigest()}.config'
 
 
 class Configuration:
+    _cache: Optional[ConfigurationCache]
     _config: Dict
+    _digest: Optional[str]
+    _displays: Dict[str, 'Configuration']
+    _profile: Optional[str]
+    _profile_index: Dict[Tuple[str, ...], str]
 
-    def __init__(self, config_location: str = None):
+    def __init__(self, config_location: str = None, use_cache: bool = True):
         self._config_location = config_location or f'{Path.home()}/.config/randrer/randrer.yaml'
-        self._load_config()
-        self._validate_config()
+        self._cache = ConfigurationCache() if use_cache else None
+        self._digest = None
+        self._profile = None
+        cached = self._cache.load(self._config_location) if self._cache is not None else None
+        if cached is not None:
+            self._config, self._profile_index, display_indices = cached
+        else:
+            self._load_config()
+            self._validate_config()
+            self._profile_index = self._index_profiles(self._config)
+            display_indices = {
+                display: self._index_profiles(display_config)
+                for display, display_config in self._config.get('displays', {}).items()
+            }
+            self._cache is not None and self._cache.save(
+                self._config_location,
+                (self._config, self._profile_index, display_indices)
+            )
+        self._displays = {
+            display: self._from_compiled(self._config_location, display_config, display_indices.get(display))
+            for display, display_config in self._config.get('displays', {}).items()
+        }
+
+    @classmethod
+    def _from_compiled(
+            cls,
+            config_location: str,
+            config: Dict,
+            profile_index: Dict[Tuple[str, ...], str]
+    ) -> 'Configuration':
+        configuration = cls.__new__(cls)
+        configuration._config_location = config_location
+        configuration._cache = None
+        configuration._config = config
+        configuration._digest = None
+        configuration._displays = {}
+        configuration._profile = None
+        configuration._profile_index = profile_index
+        return configuration
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = sha1(dumps(self._config)).hexdigest()
+        return self._digest
+
+    @property
+    def displays(self) -> Dict[str, 'Configuration']:
+        return self._displays
+
+    @property
+    def has_profiles(self) -> bool:
+        return bool(self._profile_index)
+
+    @property
+    def profile(self) -> Optional[str]:
+        return self._profile
+
+    @property
+    def uses_fingerprints(self) -> bool:
+        return self.has_profiles or any(
+            'fingerprint' in output_config
+            for config in [self._config, *self._config.get('profiles', {}).values()]
+            for output_config in config.get('outputs', {}).values()
+        )
+
+    @property
+    def uses_lid_state(self) -> bool:
+        return any(
+            output_config.get('off_on_lid_close')
+            for config in [self._config, *self._config.get('profiles', {}).values()]
+            for output_config in config.get('outputs', {}).values()
+        )
+
+    def select_profile(self, fingerprints: Iterable[str]) -> Optional[str]:
+        key = tuple(sorted(set(fingerprints)))
+        profile = self._profile_index.get(key)
+        if profile is None and 'layout' not in self._config:
+            raise ValueError(f'No profile matches the connected monitors {", ".join(key) or "(none)"}')
+        self._profile = profile
+        return profile
+
+    def _index_profiles(self, config: Dict) -> Dict[Tuple[str, ...], str]:
+        profile_index = {}
+        for name, profile in config.get('profiles', {}).items():
+            key = tuple(sorted(set(profile.get('monitors'))))
+            if key in profile_index:
+                raise ValueError(
+                    f'Invalid configuration for profile {name}, profile {profile_index[key]} matches the same monitors'
+                )
+            profile_index[key] = name
+        return profile_index
 
     def _load_config(self):
+        from yaml import load
+        try:
+            from yaml import CSafeLoader as SafeLoader
+        except ImportError:
+            from yaml import SafeLoader
         config_location = self._config_location
         try:
             with open(config_location, 'r') as file_handle:
-                self._config = safe_load(file_handle)
+                self._config = load(file_handle, Loader=SafeLoader)
         except FileNotFoundError:
             raise FileNotFoundError(f'No configuration was found at {config_location}') from None
 
     def _validate_config(self):
         config = self._config
+        displays = config.get('displays')
+        if displays is None:
+            self._validate_display(config, '')
+            return
+        if not isinstance(displays, dict) or not displays:
+            raise ValueError('Invalid configuration, displays must map display names such as :0 or :0.1 to a layout')
+        for display, display_config in displays.items():
+            self._validate_display(display_config, f' for display {display}')
+
+    def _validate_display(self, config: Dict, context: str):
+        profiles = config.get('profiles', {})
+        if not profiles or 'layout' in config or 'outputs' in config:
+            self._validate_layout(config, context)
+        for name, profile in profiles.items():
+            if not isinstance(profile.get('monitors'), list):
+                raise ValueError(f'Missing required configuration for profile {name}{context}, monitors')
+            profile['monitors'] = [str(EdidFingerprint.parse(monitor)) for monitor in profile.get('monitors')]
+            self._validate_layout(profile, f' for profile {name}{context}')
+
+    def _validate_layout(self, config: Dict, context: str):
         for required in ['layout', 'outputs']:
             if required not in config:
-                raise ValueError(f'Missing required configuration, {required}')
+                raise ValueError(f'Missing required configuration{context}, {required}')
         layout = config.get('layout')
         if layout.get('type') not in ['linear']:
-            raise ValueError(f'Invalid layout type {layout.get("type")}')
+            raise ValueError(f'Invalid layout type {layout.get("type")}{context}')
         if 'arrangements' not in layout:
-            raise ValueError('Missing required configuration for layout, arrangements')
+            raise ValueError(f'Missing required configuration for layout{context}, arrangements')
         outputs = config.get('outputs')
         for output, output_config in outputs.items():
-            for required in ['type', 'number']:
-                if required not in output_config:
-                    raise ValueError(f'Missing required configuration for output {output}, {required}')
+            if 'fingerprint' in output_config:
+                output_config['fingerprint'] = str(EdidFingerprint.parse(output_config.get('fingerprint')))
+            elif 'name' not in output_config:
+                for required in ['type', 'number']:
+                    if required not in output_config:
+                        raise ValueError(
+                            f'Missing required configuration for output {output}, {required}, name or fingerprint'
+                        )
+                if not all(part.isdigit() for part in str(output_config.get('number')).split('-')):
+                    raise ValueError(f'Invalid configuration for output {output}, number must be an integer or a '
+                                     f'connector path such as 1-2')
             if 'mode' not in output_config and 'use_preferred' not in output_config:
                 raise ValueError(
                     f'Missing required configuration for output {output}, must select one of mode or use_preferred'
@@ -43,10 +215,27 @@ class Configuration:
                 raise ValueError(
                     f'Invalid configuration for output {output}, may only select one of mode or use_preferred'
                 )
+            mode = str(output_config.get('mode', ''))
+            if '@' in mode and 'refresh' in output_config:
+                raise ValueError(
+                    f'Invalid configuration for output {output}, may only select one of mode@refresh or refresh'
+                )
+            refresh = mode.split('@', 1)[1] if '@' in mode else output_config.get('refresh', 'max')
+            if not self._is_valid_refresh(refresh):
+                raise ValueError(f'Invalid configuration for output {output}, refresh must be max or a number')
             if 'rotation' in output_config and output_config.get('rotation') not in (0, 90, 180, 270):
                 raise ValueError(f'Invalid configuration for output {output}, rotation must be one of 0, 90, 180, 270')
 
+    def _is_valid_refresh(self, refresh) -> bool:
+        if refresh == 'max':
+            return True
+        try:
+            return float(refresh) > 0
+        except (TypeError, ValueError):
+            return False
+
     def get(self, key: str):
-        if key not in self._config:
+        config = self._config.get('profiles').get(self._profile) if self._profile is not None else self._config
+        if key not in config:
             raise KeyError(f'Invalid configuration, {key}')
-        return self._config.get(key)
+        return config.get(key)
@@ -0,0 +1,113 @@
+from os import unlink
+from selectors import DefaultSelector, EVENT_READ
+from signal import signal, SIGUSR1, SIGUSR2, SIG_DFL
+from socket import socket, socketpair, AF_UNIX, SOCK_STREAM
+from sys import stdin, stderr
+from time import monotonic
+
+from randrer.paths import get_display_key, get_runtime_directory
+
+CONFIRMED = 'confirm'
+REVERTED = 'revert'
+TIMED_OUT = 'timeout'
+
+
+def get_confirmation_socket_location(display: str = None) -> str:
+    return f'{get_runtime_directory()}/confirm-{get_display_key(display)}.sock'
+
+
+class ConfirmationWaiter:
+    _socket_location: str
+    _timeout: float
+    _use_tty: bool
+
+    def __init__(self, timeout: float, socket_location: str = None, use_tty: bool = True):
+        self._timeout = timeout
+        self._socket_location = socket_location or get_confirmation_socket_location()
+        self._use_tty = use_tty
+
+    def wait(self) -> str:
+        if self._timeout <= 0:
+            return TIMED_OUT
+        selector = DefaultSelector()
+        listener = self._listen()
+        signal_reader, signal_writer = socketpair()
+        previous_handlers = {
+            signal_number: signal(signal_number, lambda number, frame: signal_writer.send(bytes([number])))
+            for signal_number in (SIGUSR1, SIGUSR2)
+        }
+        use_tty = self._use_tty and stdin.isatty()
+        terminal_settings = self._enter_cbreak() if use_tty else None
+        try:
+            selector.register(listener, EVENT_READ)
+            selector.register(signal_reader, EVENT_READ)
+            use_tty and selector.register(stdin, EVENT_READ)
+            use_tty and print(
+                f'Press y to keep this configuration or any other key to revert, reverting in {self._timeout:g} '
+                f'seconds.',
+                file=stderr
+            )
+            return self._select(selector, listener, signal_reader)
+        except KeyboardInterrupt:
+            return REVERTED
+        finally:
+            terminal_settings is not None and self._exit_cbreak(terminal_settings)
+            for signal_number, handler in previous_handlers.items():
+                signal(signal_number, handler if handler is not None else SIG_DFL)
+            selector.close()
+            signal_reader.close()
+            signal_writer.close()
+            listener.close()
+            unlink(self._socket_location)
+
+    def _enter_cbreak(self):
+        from termios import tcgetattr
+        from tty import setcbreak
+        terminal_settings = tcgetattr(stdin)
+        setcbreak(stdin)
+        return terminal_settings
+
+    def _exit_cbreak(self, terminal_settings):
+        from termios import tcsetattr, TCSADRAIN
+        tcsetattr(stdin, TCSADRAIN, terminal_settings)
+
+    def _listen(self) -> socket:
+        location = self._socket_location
+        try:
+            unlink(location)
+        except FileNotFoundError:
+            pass
+        listener = socket(AF_UNIX, SOCK_STREAM)
+        listener.bind(location)
+        listener.listen()
+        return listener
+
+    def _select(self, selector: DefaultSelector, listener: socket, signal_reader: socket) -> str:
+        deadline = monotonic() + self._timeout
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return TIMED_OUT
+            for key, _ in selector.select(remaining):
+                if key.fileobj is listener:
+                    connection, _ = listener.accept()
+                    with connection:
+                        message = connection.recv(16).decode().strip()
+                    if message in (CONFIRMED, REVERTED):
+                        return message
+                elif key.fileobj is signal_reader:
+                    return CONFIRMED if signal_reader.recv(1)[0] == SIGUSR1 else REVERTED
+                else:
+                    return CONFIRMED if stdin.read(1).lower() == 'y' else REVERTED
+
+
+def send_confirmation(message: str, socket_location: str = None):
+    location = socket_location or get_confirmation_socket_location()
+    client = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        client.connect(location)
+        client.sendall(message.encode())
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise FileNotFoundError('No configuration is waiting for confirmation') from None
+    finally:
+        client.close()
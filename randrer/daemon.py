@@ -0,0 +1,155 @@
+from os import unlink
+from select import select
+from time import monotonic
+from typing import Optional, Tuple
+
+from Xlib.ext.randr import RRScreenChangeNotifyMask, RRCrtcChangeNotifyMask, RROutputChangeNotifyMask, \
+    RROutputPropertyNotifyMask
+from Xlib.error import XError
+
+from randrer.config import Configuration
+from randrer.layout_cache import LayoutCache
+from randrer.lid import LidStateProvider
+from randrer.randr_adapter import RandrAdapter
+from randrer.screen import ScreenManager
+from randrer.snapshot import ResourceSnapshotStore
+
+
+class HotplugDaemon:
+    lid_poll_interval: float = 1.0
+    _adapter: RandrAdapter
+    _config: Configuration
+    _debounce: float
+    _is_lid_changed: bool
+    _layout_cache: Optional[LayoutCache]
+    _lid_state: Optional[LidStateProvider]
+    _max_delay: float
+    _probe: bool
+    _resource_store: Optional[ResourceSnapshotStore]
+    _screen_manager: Optional[ScreenManager]
+    _topology: Tuple
+
+    def __init__(
+            self,
+            adapter: RandrAdapter,
+            config: Configuration,
+            debounce: float = 0.05,
+            max_delay: float = 0.5,
+            probe: bool = False,
+            lid_state: LidStateProvider = None,
+            layout_cache: LayoutCache = None,
+            resource_store: ResourceSnapshotStore = None
+    ):
+        self._adapter = adapter
+        self._config = config
+        self._debounce = debounce
+        self._is_lid_changed = False
+        self._layout_cache = layout_cache
+        self._lid_state = lid_state
+        self._max_delay = max_delay
+        self._probe = probe
+        self._resource_store = resource_store
+        self._screen_manager = None
+        self._topology = ()
+
+    @property
+    def screen_manager(self) -> Optional[ScreenManager]:
+        return self._screen_manager
+
+    @property
+    def topology(self) -> Tuple:
+        return self._topology
+
+    def run(self):
+        self._adapter.select_input(
+            RRScreenChangeNotifyMask | RRCrtcChangeNotifyMask | RROutputChangeNotifyMask | RROutputPropertyNotifyMask
+        )
+        self._screen_manager = ScreenManager(
+            self._adapter,
+            self._config,
+            self._probe,
+            self._lid_state,
+            self._layout_cache
+        )
+        self._lid_state is not None and self._lid_state.add_listener(self._on_lid_change)
+        self._apply()
+        try:
+            while True:
+                self._save_resources()
+                self._wait_for_events()
+                self.on_change()
+        finally:
+            self._remove_resources()
+
+    def on_change(self):
+        screen_manager = self._screen_manager
+        try:
+            screen_manager.refresh()
+        except XError as e:
+            # Outputs that go away during discovery fail their requests, the events of the hotplug follow.
+            print(e)
+            return
+        # Our own modesets generate events as well, only a change in the connected monitors or of the lid warrants a
+        # new layout.
+        if self._get_topology() != self._topology or self._is_lid_changed:
+            self._apply()
+
+    def _apply(self):
+        # A polled lid is read again here, otherwise the layout reading it would report the change once more.
+        self._is_lid_polled() and self._lid_state.refresh()
+        self._is_lid_changed = False
+        try:
+            self._screen_manager.apply_config(grab=True)
+        except (ValueError, KeyError) as e:
+            print(e)
+        except XError as e:
+            print(e)
+            # The commit stopped part way, what took effect is only known after discovering again.
+            self._screen_manager.mark_stale()
+        self._topology = self._get_topology()
+
+    def _get_topology(self) -> Tuple:
+        return self._screen_manager.get_connected_monitors()
+
+    def _is_lid_polled(self) -> bool:
+        return self._lid_state is not None and self._lid_state.fileno() is None
+
+    def _on_lid_change(self, is_closed: bool):
+        self._is_lid_changed = True
+
+    def _remove_resources(self):
+        resource_store = self._resource_store
+        if resource_store is not None:
+            try:
+                unlink(resource_store.location)
+            except FileNotFoundError:
+                pass
+
+    def _save_resources(self):
+        # Kept warm for get-outputs --cached, which then answers without a connection to the X server.
+        self._resource_store is not None and self._resource_store.save(self._screen_manager.get_resource_snapshot())
+
+    def _wait_for_events(self):
+        display = self._adapter.display
+        screen_manager = self._screen_manager
+        lid_state = self._lid_state
+        is_lid_polled = self._is_lid_polled()
+        sources = [display, lid_state] if lid_state is not None and not is_lid_polled else [display]
+        deadline = None
+        while True:
+            while display.pending_events():
+                screen_manager.handle_event(display.next_event())
+                deadline = deadline or monotonic() + self._max_delay
+            timeout = min(self._debounce, deadline - monotonic()) if deadline is not None \
+                else self.lid_poll_interval if is_lid_polled else None
+            if timeout is not None and timeout <= 0:
+                return
+            readable = select(sources, [], [], timeout)[0]
+            if lid_state in readable:
+                lid_state.handle_readable()
+            elif not readable and is_lid_polled:
+                lid_state.refresh()
+            # A lid change is a single event, so there is nothing to debounce. Any pending output changes are read by
+            # the refresh that follows.
+            if self._is_lid_changed or (not readable and deadline is not None):
+                return
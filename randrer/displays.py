@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from randrer.config import Configuration
+
+
+class DisplayResult(NamedTuple):
+    display: str
+    value: Any
+    duration: float
+    error: Optional[Exception]
+
+    @property
+    def is_successful(self) -> bool:
+        return self.error is None
+
+
+class DisplayPool:
+    _max_workers: Optional[int]
+
+    def __init__(self, max_workers: int = None):
+        self._max_workers = max_workers
+
+    def map(self, task: Callable[[str, Configuration], Any], configs: Dict[str, Configuration]) -> List[DisplayResult]:
+        if not configs:
+            return []
+        # Each task holds its own connection and spends its time waiting on the X server, which releases the GIL, so
+        # threads are enough to overlap the displays.
+        with ThreadPoolExecutor(self._max_workers or len(configs)) as executor:
+            futures = [executor.submit(self._run, task, display, config) for display, config in configs.items()]
+            return [future.result() for future in futures]
+
+    def _run(self, task: Callable[[str, Configuration], Any], display: str, config: Configuration) -> DisplayResult:
+        start = perf_counter()
+        try:
+            return DisplayResult(display, task(display, config), perf_counter() - start, None)
+        except Exception as e:
+            return DisplayResult(display, None, perf_counter() - start, e)
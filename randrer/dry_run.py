@@ -0,0 +1,35 @@
+from typing import NamedTuple, Optional
+
+from randrer.config import Configuration
+from randrer.fake_adapter import FakeRandrAdapter, FakeTopology
+from randrer.plan import CommitPlan
+from randrer.screen import ScreenManager
+from randrer.snapshot import ResourceSnapshot
+
+
+class DryRunResult(NamedTuple):
+    plan: CommitPlan
+    profile: Optional[str]
+    modesets: int
+    round_trips: int
+
+
+class DryRun:
+    _resources: ResourceSnapshot
+
+    def __init__(self, resources: ResourceSnapshot):
+        self._resources = resources
+
+    @property
+    def resources(self) -> ResourceSnapshot:
+        return self._resources
+
+    def plan(self, config: Configuration) -> DryRunResult:
+        # The recorded resources are replayed by the in-memory server, so the prediction runs exactly the code an apply
+        # would, including its rediscovery and grab, without touching a real display.
+        adapter = FakeRandrAdapter(FakeTopology.from_snapshot(self._resources))
+        screen_manager = ScreenManager(adapter, config)
+        statistics = adapter.statistics
+        modesets, round_trips = statistics.modesets, statistics.round_trips
+        plan = screen_manager.apply_config(grab=True)
+        return DryRunResult(plan, config.profile, statistics.modesets - modesets, statistics.round_trips - round_trips)
@@ -0,0 +1,42 @@
+from typing import NamedTuple, Optional
+
+_header = b'\x00\xff\xff\xff\xff\xff\xff\x00'
+_serial_descriptor = 0xff
+
+
+class EdidFingerprint(NamedTuple):
+    manufacturer: str
+    product: int
+    serial: str
+
+    @classmethod
+    def from_edid(cls, edid: bytes) -> Optional['EdidFingerprint']:
+        if len(edid) < 128 or edid[:8] != _header:
+            return None
+        vendor = edid[8] << 8 | edid[9]
+        manufacturer = ''.join(chr((vendor >> shift & 0x1f) + 64) for shift in (10, 5, 0))
+        product = edid[10] | edid[11] << 8
+        serial = int.from_bytes(edid[12:16], 'little')
+        for offset in range(54, 126, 18):
+            descriptor = edid[offset:offset + 18]
+            # The text serial number is more reliably unique than the numeric one, which many panels leave at zero.
+            if descriptor[:3] == b'\x00\x00\x00' and descriptor[3] == _serial_descriptor:
+                text = descriptor[5:].split(b'\n', 1)[0].decode('ascii', 'replace').strip()
+                if text:
+                    return cls(manufacturer, product, text)
+        return cls(manufacturer, product, str(serial) if serial else '')
+
+    @classmethod
+    def parse(cls, fingerprint: str) -> 'EdidFingerprint':
+        parts = str(fingerprint).split(':', 2)
+        try:
+            if len(parts) != 3 or len(parts[0]) != 3:
+                raise ValueError
+            return cls(parts[0].upper(), int(parts[1], 16), parts[2])
+        except ValueError:
+            raise ValueError(
+                f'Invalid fingerprint {fingerprint}, must be manufacturer:product:serial such as DEL:A0B1:CFV9N13'
+            ) from None
+
+    def __str__(self) -> str:
+        return f'{self.manufacturer}:{self.product:04X}:{self.serial}'
@@ -0,0 +1,477 @@
+from collections import Counter, deque
+from socket import socket, socketpair
+from threading import Timer
+from time import sleep
+from types import SimpleNamespace
+from typing import NamedTuple, List, Dict, Deque, Optional, Tuple, Type, Union
+
+from Xlib.ext.randr import Connected, Disconnected, GetCrtcInfo, GetOutputInfo, GetOutputPrimary, GetOutputProperty, \
+    GetScreenResources, GetScreenResourcesCurrent, Rotate_0, Rotate_90, Rotate_270, SelectInput, \
+    SetConfigInvalidConfigTime, SetConfigSuccess, SetCrtcConfig, SetScreenSize
+from Xlib.Xatom import INTEGER
+from Xlib.error import BadMatch
+from Xlib.protocol.request import GetGeometry
+from Xlib.protocol.rq import Request, ReplyRequest
+
+from randrer.edid import EdidFingerprint
+from randrer.randr_adapter import RandrAdapter
+from randrer.screen_resources import Crtc, Mode
+from randrer.snapshot import ResourceSnapshot
+
+_edid_atom = 80
+
+
+class FakeOutput(NamedTuple):
+    id: int
+    name: str
+    crtc: int
+    crtcs: List[int]
+    modes: List[int]
+    connection: int
+    mm_width: int
+    mm_height: int
+    num_preferred: int
+    edid: bytes = b''
+
+
+def make_edid(manufacturer: str, product: int, serial: Union[int, str]) -> bytes:
+    vendor = 0
+    for letter in manufacturer:
+        vendor = vendor << 5 | (ord(letter) - 64)
+    edid = bytearray(128)
+    edid[:8] = b'\x00\xff\xff\xff\xff\xff\xff\x00'
+    edid[8:10] = vendor.to_bytes(2, 'big')
+    edid[10:12] = product.to_bytes(2, 'little')
+    if isinstance(serial, int) or serial.isdigit() or not serial:
+        edid[12:16] = int(serial or 0).to_bytes(4, 'little')
+    else:
+        edid[54:59] = b'\x00\x00\x00\xff\x00'
+        edid[59:72] = serial.encode('ascii', 'replace')[:13].ljust(13, b'\n')
+    edid[127] = -sum(edid) % 256
+    return bytes(edid)
+
+
+class FakeTopology:
+    config_timestamp: int
+    crtcs: Dict[int, Crtc]
+    height: int
+    height_mm: int
+    modes: List[Mode]
+    outputs: Dict[int, FakeOutput]
+    timestamp: int
+    width: int
+    width_mm: int
+
+    def __init__(
+            self,
+            modes: List[Mode],
+            crtcs: Dict[int, Crtc],
+            outputs: Dict[int, FakeOutput],
+            width: int,
+            height: int,
+            width_mm: int,
+            height_mm: int
+    ):
+        self.modes = modes
+        self.crtcs = crtcs
+        self.outputs = outputs
+        self.width = width
+        self.height = height
+        self.width_mm = width_mm
+        self.height_mm = height_mm
+        self.config_timestamp = 1
+        self.timestamp = 1
+
+    @classmethod
+    def generate(cls, output_count: int, connected_count: int = None) -> 'FakeTopology':
+        connected_count = output_count if connected_count is None else connected_count
+        modes = [
+            Mode(1, '1920x1080', 1920, 1080, 148500000, 2008, 2052, 2200, 0, 1084, 1089, 1125, 9, 5),
+            Mode(2, '2560x1440', 2560, 1440, 241500000, 2608, 2640, 2720, 0, 1443, 1448, 1481, 9, 9),
+            Mode(3, '2560x1440', 2560, 1440, 586586000, 2568, 2600, 2720, 0, 1443, 1448, 1497, 9, 9),
+        ]
+        crtc_ids = [crtc_id for crtc_id in range(64, 64 + output_count)]
+        crtcs = {crtc_id: Crtc(crtc_id, 0, [], [], Rotate_0, 0, 0, 0, 0) for crtc_id in crtc_ids}
+        outputs = {}
+        for index in range(output_count):
+            output_id = 256 + index
+            outputs[output_id] = FakeOutput(
+                output_id,
+                'eDP-1' if index == 0 else f'DP-{index}',
+                0,
+                crtc_ids,
+                [1] if index == 0 else [2, 3, 1],
+                Connected if index < connected_count else Disconnected,
+                310 if index == 0 else 600,
+                170 if index == 0 else 340,
+                1,
+                make_edid('FAK', index, 1000 + index)
+            )
+        first_output = next(iter(outputs))
+        crtcs[crtc_ids[0]] = Crtc(crtc_ids[0], 1, [first_output], [first_output], Rotate_0, 1920, 1080, 0, 0)
+        outputs[first_output] = outputs[first_output]._replace(crtc=crtc_ids[0])
+        return cls(modes, crtcs, outputs, 1920, 1080, 310, 170)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: ResourceSnapshot) -> 'FakeTopology':
+        outputs = {}
+        for output in snapshot.outputs:
+            fingerprint = EdidFingerprint.parse(output.fingerprint) if output.fingerprint is not None else None
+            outputs[output.id] = FakeOutput(
+                output.id,
+                output.name,
+                output.crtc,
+                list(output.crtcs),
+                list(output.modes),
+                output.connection,
+                output.mm_width,
+                output.mm_height,
+                output.num_preferred,
+                make_edid(*fingerprint) if fingerprint is not None else b''
+            )
+        screen_size = snapshot.screen_size
+        topology = cls(
+            list(snapshot.modes),
+            {crtc.id: crtc for crtc in snapshot.crtcs},
+            outputs,
+            screen_size.width,
+            screen_size.height,
+            screen_size.width_mm,
+            screen_size.height_mm
+        )
+        topology.config_timestamp = snapshot.config_timestamp
+        topology.timestamp = snapshot.timestamp
+        return topology
+
+    def set_connection(self, output_id: int, connection: int):
+        output = self.outputs[output_id]
+        self.outputs[output_id] = output._replace(connection=connection)
+        self.config_timestamp += 1
+
+
+class FakeStatistics:
+    modesets: int
+    requests: Counter
+    round_trips: int
+
+    def __init__(self):
+        self.modesets = 0
+        self.requests = Counter()
+        self.round_trips = 0
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+
+class FakeBadMatch(BadMatch):
+    def __init__(self, message: str):
+        super().__init__(None, bytes(32))
+        self._message = message
+
+    def __str__(self) -> str:
+        return self._message
+
+
+class FakeReply(SimpleNamespace):
+    def __init__(self, adapter: 'FakeRandrAdapter', **fields):
+        super().__init__(**fields)
+        self._adapter = adapter
+        self._error = None
+        self._received = False
+
+    def reply(self):
+        self._adapter.receive(self)
+        if self._error is not None:
+            raise self._error
+
+
+class FakeDisplay:
+    events: Deque
+    _adapter: 'FakeRandrAdapter'
+    _wakeup: Optional[Tuple[socket, socket]]
+
+    def __init__(self, adapter: 'FakeRandrAdapter'):
+        self.events = deque()
+        self._adapter = adapter
+        self._wakeup = None
+
+    def fileno(self) -> int:
+        if self._wakeup is None:
+            self._wakeup = socketpair()
+            for end in self._wakeup:
+                end.setblocking(False)
+        return self._wakeup[0].fileno()
+
+    def flush(self):
+        pass
+
+    def get_atom(self, name: str, only_if_exists: bool = False) -> int:
+        return {'EDID': _edid_atom}.get(name, 0)
+
+    def grab_server(self):
+        pass
+
+    def next_event(self):
+        return self.events.popleft()
+
+    def pending_events(self) -> int:
+        if self._wakeup is not None:
+            try:
+                received = self._wakeup[0].recv(4096)
+            except BlockingIOError:
+                received = b''
+            # Replies only arrive once the simulated latency has passed, events are delivered as they are queued.
+            b'r' in received and self._adapter.deliver()
+        return len(self.events)
+
+    def screen(self):
+        topology = self._adapter.topology
+        return SimpleNamespace(
+            root=SimpleNamespace(display=None),
+            width_in_pixels=topology.width,
+            height_in_pixels=topology.height,
+            width_in_mms=topology.width_mm,
+            height_in_mms=topology.height_mm
+        )
+
+    def sync(self):
+        pass
+
+    def ungrab_server(self):
+        pass
+
+    def wake(self, kind: bytes, delay: float = 0.0):
+        if self._wakeup is None:
+            return
+        if delay:
+            Timer(delay, self.wake, (kind,)).start()
+            return
+        try:
+            self._wakeup[1].send(kind)
+        except BlockingIOError:
+            pass
+
+
+class FakeRandrAdapter(RandrAdapter):
+    latency: float
+    modeset_latency: float
+    probe_latency: float
+    statistics: FakeStatistics
+    topology: FakeTopology
+    _errors: List[Exception]
+    _pending: List[FakeReply]
+
+    def __init__(
+            self,
+            topology: FakeTopology,
+            latency: float = 0.0,
+            modeset_latency: float = 0.0,
+            probe_latency: float = 0.0
+    ):
+        self.topology = topology
+        self.latency = latency
+        self.modeset_latency = modeset_latency
+        self.probe_latency = probe_latency
+        self.statistics = FakeStatistics()
+        self._errors = []
+        self._pending = []
+        super().__init__(FakeDisplay(self))
+        self._opcode = 0
+
+    def get_geometry(self, defer: bool = False):
+        topology = self.topology
+        return self._reply(GetGeometry, defer, width=topology.width, height=topology.height)
+
+    def deliver(self):
+        if not self._pending:
+            return
+        self.statistics.round_trips += 1
+        for pending in self._pending:
+            pending._received = True
+        self._pending = []
+
+    def is_replied(self, reply: FakeReply) -> bool:
+        return reply._received
+
+    def notify(self, event):
+        self.display.events.append(event)
+        self.display.wake(b'e')
+
+    def receive(self, reply: FakeReply):
+        if reply._received:
+            return
+        self.latency and sleep(self.latency)
+        self.deliver()
+
+    def request(self, request_type: Type[Union[Request, ReplyRequest]], defer: bool = False, **keys):
+        handlers = {
+            GetCrtcInfo: self._get_crtc_info,
+            GetOutputInfo: self._get_output_info,
+            GetOutputPrimary: self._get_output_primary,
+            GetOutputProperty: self._get_output_property,
+            GetScreenResources: self._get_screen_resources,
+            GetScreenResourcesCurrent: self._get_screen_resources,
+            SelectInput: self._select_input,
+            SetCrtcConfig: self._set_crtc_config,
+            SetScreenSize: self._set_screen_size,
+        }
+        if request_type not in handlers:
+            raise NotImplementedError(f'{request_type.__name__} is not supported by {type(self).__name__}')
+        if request_type is GetScreenResources:
+            self.probe_latency and sleep(self.probe_latency)
+        return handlers[request_type](request_type, defer, **keys)
+
+    def _get_crtc_info(self, request_type, defer: bool, crtc: int, config_timestamp: int):
+        info = self.topology.crtcs[crtc]
+        return self._reply(
+            request_type,
+            defer,
+            status=SetConfigSuccess,
+            timestamp=self.topology.timestamp,
+            x=info.x,
+            y=info.y,
+            width=info.width,
+            height=info.height,
+            mode=info.mode,
+            rotation=info.rotation,
+            possible_rotations=Rotate_0 | Rotate_90 | Rotate_270,
+            outputs=list(info.outputs),
+            possible_outputs=list(info.possible_outputs)
+        )
+
+    def _get_output_info(self, request_type, defer: bool, output: int, config_timestamp: int):
+        info = self.topology.outputs[output]
+        return self._reply(
+            request_type,
+            defer,
+            status=SetConfigSuccess,
+            timestamp=self.topology.timestamp,
+            crtc=info.crtc,
+            mm_width=info.mm_width,
+            mm_height=info.mm_height,
+            connection=info.connection,
+            subpixel_order=0,
+            crtcs=list(info.crtcs),
+            modes=list(info.modes),
+            num_preferred=info.num_preferred,
+            clones=[],
+            name=info.name
+        )
+
+    def _get_output_primary(self, request_type, defer: bool, window):
+        return self._reply(request_type, defer, output=next(iter(self.topology.outputs), 0))
+
+    def _get_output_property(
+            self,
+            request_type,
+            defer: bool,
+            output: int,
+            property: int,
+            type: int,
+            long_offset: int,
+            long_length: int,
+            delete: bool,
+            pending: bool
+    ):
+        info = self.topology.outputs[output]
+        edid = info.edid if property == _edid_atom and info.connection == Connected else b''
+        value = edid[long_offset * 4:(long_offset + long_length) * 4]
+        return self._reply(
+            request_type,
+            defer,
+            property_type=INTEGER if edid else 0,
+            bytes_after=max(0, len(edid) - (long_offset + long_length) * 4),
+            value=list(value)
+        )
+
+    def _get_screen_resources(self, request_type, defer: bool, window):
+        topology = self.topology
+        return self._reply(
+            request_type,
+            defer,
+            timestamp=topology.timestamp,
+            config_timestamp=topology.config_timestamp,
+            crtcs=list(topology.crtcs),
+            outputs=list(topology.outputs),
+            modes=list(topology.modes),
+            mode_names=''.join(mode.name for mode in topology.modes)
+        )
+
+    def _reply(self, request_type, defer: bool, error: Exception = None, **fields) -> FakeReply:
+        self.statistics.requests[request_type.__name__] += 1
+        reply = FakeReply(self, **fields)
+        # The error of a request without a reply precedes the replies of later requests, reading one of them raises it.
+        reply._error = self._errors.pop(0) if self._errors else error
+        self._pending.append(reply)
+        if not defer:
+            reply.reply()
+        elif len(self._pending) == 1:
+            self.display.wake(b'r', self.latency)
+        return reply
+
+    def _select_input(self, request_type, defer: bool, window, mask: int):
+        self.statistics.requests[request_type.__name__] += 1
+
+    def _set_crtc_config(
+            self,
+            request_type,
+            defer: bool,
+            crtc: int,
+            config_timestamp: int,
+            x: int,
+            y: int,
+            mode: int,
+            rotation: int,
+            outputs: List[int],
+            timestamp: int
+    ):
+        topology = self.topology
+        if config_timestamp != topology.config_timestamp:
+            return self._reply(request_type, defer, status=SetConfigInvalidConfigTime, new_timestamp=topology.timestamp)
+        modes = {available_mode.id: available_mode for available_mode in topology.modes}
+        current = topology.crtcs[crtc]
+        width, height = 0, 0
+        if mode != 0:
+            width, height = modes[mode].width, modes[mode].height
+            if rotation & (Rotate_90 | Rotate_270):
+                width, height = height, width
+            if x + width > topology.width or y + height > topology.height:
+                # Like the server, the error is only reported when the reply is read.
+                return self._reply(
+                    request_type,
+                    defer,
+                    FakeBadMatch(f'BadMatch: CRTC {crtc} does not fit the {topology.width}x{topology.height} screen')
+                )
+        updated = Crtc(crtc, mode, current.possible_outputs, list(outputs), rotation, width, height, x, y)
+        if updated != current:
+            self.statistics.modesets += 1
+            self.modeset_latency and sleep(self.modeset_latency)
+            for output_id in current.outputs:
+                topology.outputs[output_id] = topology.outputs[output_id]._replace(crtc=0)
+            for output_id in outputs:
+                topology.outputs[output_id] = topology.outputs[output_id]._replace(crtc=crtc)
+            topology.crtcs[crtc] = updated
+            topology.timestamp += 1
+        return self._reply(request_type, defer, status=SetConfigSuccess, new_timestamp=topology.timestamp)
+
+    def _set_screen_size(
+            self,
+            request_type,
+            defer: bool,
+            window,
+            width: int,
+            height: int,
+            width_in_millimeters: Optional[int],
+            height_in_millimeters: Optional[int]
+    ):
+        self.statistics.requests[request_type.__name__] += 1
+        topology = self.topology
+        for crtc in topology.crtcs.values():
+            if crtc.mode != 0 and (crtc.x + crtc.width > width or crtc.y + crtc.height > height):
+                self._errors.append(FakeBadMatch(f'BadMatch: CRTC {crtc.id} does not fit the {width}x{height} screen'))
+                return
+        topology.width = width
+        topology.height = height
+        topology.width_mm = width_in_millimeters
+        topology.height_mm = height_in_millimeters
@@ -0,0 +1,38 @@
+from os import pipe, write
+from socket import socket, socketpair
+from struct import pack
+
+from randrer.lid import AcpidLidStateProvider, EvdevLidStateProvider, LidStateProvider, EV_SW, SW_LID, INPUT_EVENT
+
+
+class FakeLidEventSource:
+    _acpid: socket
+    _evdev: int
+
+    def __init__(self):
+        self._acpid = None
+        self._evdev = None
+
+    def acpid_provider(self, fallback: LidStateProvider = None) -> AcpidLidStateProvider:
+        self._acpid, connection = socketpair()
+        return AcpidLidStateProvider(fallback=fallback, connection=connection)
+
+    def close_lid(self):
+        self._send(True)
+
+    def evdev_provider(self, is_closed: bool = False) -> EvdevLidStateProvider:
+        reader, self._evdev = pipe()
+        provider = EvdevLidStateProvider(fd=reader)
+        # A pipe can't answer the switch state ioctl, so the initial state arrives as an event.
+        self._send(is_closed)
+        provider.handle_readable()
+        return provider
+
+    def open_lid(self):
+        self._send(False)
+
+    def _send(self, is_closed: bool):
+        if self._evdev is not None:
+            write(self._evdev, pack(INPUT_EVENT, 0, 0, EV_SW, SW_LID, int(is_closed)))
+        if self._acpid is not None:
+            self._acpid.sendall(f'button/lid LID {"close" if is_closed else "open"}\n'.encode())
@@ -1,11 +1,11 @@
 from abc import ABC, abstractmethod
-from os.path import isfile
-from typing import List, Tuple, Dict, NamedTuple, Optional
+from typing import List, Tuple, Dict, NamedTuple, Optional, Set
 
 from Xlib.ext.randr import Rotate_0, Rotate_90, Rotate_180, Rotate_270
 
 from randrer.config import Configuration
-from randrer.screen_resources import Mode, Output, Crtc
+from randrer.lid import LidStateProvider
+from randrer.screen_resources import Mode, Output, Crtc, OutputIndex
 
 
 class Arrangement(NamedTuple):
@@ -46,6 +46,8 @@ class LayoutInterface(ABC):
 
 class Layout(LayoutInterface, ABC):
     _arrangements: List[Arrangement]
+    _claimed_crtcs: Set[int]
+    _output_index: OutputIndex
     _screen_x: int
     _screen_y: int
     _screen_x_mm: int
@@ -54,12 +56,14 @@ class Layout(LayoutInterface, ABC):
     def __init__(self, config: Configuration, outputs: List[Output], crtcs: Dict[int, Crtc]):
         self._config = config
         self._outputs = outputs
+        self._output_index = OutputIndex(outputs)
         self._crtcs = crtcs
         self._screen_x = 0
         self._screen_y = 0
         self._screen_x_mm = 0
         self._screen_y_mm = 0
         self._arrangements = []
+        self._claimed_crtcs = set()
         self._available_rotations = {
             0: Rotate_0,
             90: Rotate_90,
@@ -79,28 +83,31 @@ class Layout(LayoutInterface, ABC):
     def screen_size_mm(self) -> Tuple[int, int]:
         return self._screen_x_mm, self._screen_y_mm
 
-    def _find_output(self, output_type: str, number: int):
-        available_outputs = self._outputs
-        output = None
-        for available_output in available_outputs:
-            if available_output.name.startswith(output_type) and available_output.name.endswith(str(number)):
-                output = available_output
-        return output
+    def _find_output(self, output_config: Dict) -> Optional[Output]:
+        return self._output_index.find(output_config)
+
+    def _set_outputs(self, outputs: Optional[List[Output]]):
+        if outputs and outputs is not self._outputs:
+            self._outputs = outputs
+            self._output_index = OutputIndex(outputs)
 
     def _find_crtc(self, output: Output):
         available_crtcs = self._crtcs
         if output.current_crtc != 0:
             crtc = available_crtcs.get(output.current_crtc)
         else:
-            crtc = self._find_unused_crtc()
+            crtc = self._find_unused_crtc(output)
+        self._claimed_crtcs.add(crtc.id)
         return crtc
 
-    def _find_unused_crtc(self):
+    def _find_unused_crtc(self, output: Output):
         available_crtcs = self._crtcs
         for crtc_id, available_crtc in available_crtcs.items():
+            if crtc_id in self._claimed_crtcs or crtc_id not in output.crtcs:
+                continue
             if not available_crtc.outputs and available_crtc.mode == 0:
                 return available_crtc
-        raise ValueError('No unused crtcs')
+        raise ValueError(f'No unused crtcs for output {output.name}')
 
 
 class LinearLayout(Layout):
@@ -119,7 +126,8 @@ class LinearLayout(Layout):
 
     def arrange(self, outputs: List[Output] = None):
         self._arrangements = []
-        self._outputs = outputs or self._outputs
+        self._claimed_crtcs = set()
+        self._set_outputs(outputs)
         config = self._config
         output_configs = config.get('outputs')
         layout_config = config.get('layout')
@@ -129,12 +137,16 @@ class LinearLayout(Layout):
         total_y_mm = 0
         for arrangement in layout_config.get('arrangements'):
             output_config = output_configs.get(arrangement)
-            current_output = self._find_output(output_config.get('type'), output_config.get('number'))
+            current_output = self._find_output(output_config)
             if current_output is not None:
+                refresh = output_config.get('refresh')
                 if 'use_preferred' in output_config:
-                    current_output.set_mode(current_output.get_preferred_mode())
+                    mode = current_output.get_preferred_mode()
+                    if refresh is not None:
+                        mode = current_output.get_mode_by_size(mode.width, mode.height, refresh)
+                    current_output.set_mode(mode)
                 else:
-                    current_output.set_mode(current_output.get_mode_by_name(output_config.get('mode')))
+                    current_output.set_mode(current_output.get_mode_by_name(str(output_config.get('mode')), refresh))
                 crtc = self._find_crtc(current_output)
                 rotation = crtc.rotation
                 if 'rotation' in output_config:
@@ -195,10 +207,10 @@ class LayoutDecorator(LayoutInterface, ABC):
 
 class LaptopLidLayoutDecorator(LayoutDecorator):
     _disabled_arrangements: List[Arrangement]
-    _lid_state: str
+    _lid_state: LidStateProvider
 
-    def __init__(self, layout: LayoutInterface):
-        self._lid_state = '/proc/acpi/button/lid/LID/state'
+    def __init__(self, layout: LayoutInterface, lid_state: LidStateProvider):
+        self._lid_state = lid_state
         self._disabled_arrangements = []
         super().__init__(layout)
 
@@ -226,8 +238,4 @@ class LaptopLidLayoutDecorator(LayoutDecorator):
                 )
 
     def _is_lid_closed(self):
-        is_closed = isfile(self._lid_state)
-        if is_closed:
-            with open(self._lid_state, 'r') as file_handle:
-                is_closed = file_handle.read().split(':')[1].strip() == 'closed'
-        return is_closed
+        return self._lid_state.is_closed
@@ -0,0 +1,106 @@
+from marshal import dumps, loads
+from os import environ, makedirs, replace
+from os.path import dirname
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from randrer.paths import get_display_key
+from randrer.plan import CrtcChange, ScreenSize
+
+LayoutEntry = Tuple[List[CrtcChange], ScreenSize]
+
+
+class LayoutCache:
+    schema_version = 2
+    _capacity: int
+    _entries: Optional[Dict[Tuple, Tuple]]
+    _hits: int
+    _misses: int
+
+    def __init__(self, location: str = None, display: str = None, capacity: int = 32):
+        cache_home = environ.get('XDG_CACHE_HOME') or f'{Path.home()}/.cache'
+        self._location = location or f'{cache_home}/randrer/layouts-{get_display_key(display)}.cache'
+        self._capacity = capacity
+        self._entries = None
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def hits(self) -> int:
+        self._load()
+        return self._hits
+
+    @property
+    def location(self) -> str:
+        return self._location
+
+    @property
+    def misses(self) -> int:
+        self._load()
+        return self._misses
+
+    def discard(self, key: Tuple):
+        entries = self._load()
+        if entries.pop(key, None) is not None:
+            self._save()
+
+    def get(self, key: Tuple, is_valid: Callable[[LayoutEntry], bool] = None) -> Optional[LayoutEntry]:
+        entries = self._load()
+        entry = entries.pop(key, None)
+        if entry is not None:
+            targets, screen_size = entry
+            entry = [CrtcChange(*target) for target in targets], ScreenSize(*screen_size)
+            if is_valid is not None and not is_valid(entry):
+                entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        # Entries are kept in the order they were last used, so the least recently used one is evicted first.
+        entries[key] = self._pack(entry)
+        self._hits += 1
+        return entry
+
+    def put(self, key: Tuple, targets: List[CrtcChange], screen_size: ScreenSize):
+        entries = self._load()
+        entries.pop(key, None)
+        entries[key] = self._pack((targets, screen_size))
+        while len(entries) > self._capacity:
+            del entries[next(iter(entries))]
+        self._save()
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def _load(self) -> Dict[Tuple, Tuple]:
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        try:
+            with open(self._location, 'rb') as file_handle:
+                schema_version, hits, misses, entries = loads(file_handle.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return self._entries
+        if schema_version == self.schema_version:
+            self._entries = dict(entries)
+            self._hits += hits
+            self._misses += misses
+        return self._entries
+
+    def _pack(self, entry: LayoutEntry) -> Tuple:
+        targets, screen_size = entry
+        return [tuple(target[:5]) + (list(target.outputs),) for target in targets], tuple(screen_size)
+
+    def _save(self):
+        location = self._location
+        try:
+            data = dumps((self.schema_version, self._hits, self._misses, list(self._entries.items())))
+            makedirs(dirname(location), exist_ok=True)
+            with open(f'{location}.tmp', 'wb') as file_handle:
+                file_handle.write(data)
+            replace(f'{location}.tmp', location)
+        except (OSError, ValueError):
+            pass
@@ -0,0 +1,193 @@
+from abc import ABC, abstractmethod
+from fcntl import ioctl
+from glob import glob
+from os import O_NONBLOCK, O_RDONLY, close, open as os_open, read
+from socket import socket, AF_UNIX, SOCK_STREAM
+from struct import calcsize, iter_unpack
+from typing import Callable, List, Optional
+
+_acpid_location = '/var/run/acpid.socket'
+EV_SW = 0x05
+SW_LID = 0x00
+INPUT_EVENT = 'llHHi'
+
+
+def _eviocgsw(length: int) -> int:
+    return 2 << 30 | length << 16 | ord('E') << 8 | 0x1b
+
+
+class LidStateProvider(ABC):
+    _is_closed: Optional[bool]
+    _listeners: List[Callable[[bool], None]]
+
+    def __init__(self):
+        self._is_closed = None
+        self._listeners = []
+
+    @property
+    def is_closed(self) -> bool:
+        # Without a file descriptor no change is ever reported, so the state is read again instead of being kept.
+        if self._is_closed is None or self.fileno() is None:
+            self._update(self.read())
+        return self._is_closed
+
+    def add_listener(self, listener: Callable[[bool], None]):
+        self._listeners.append(listener)
+
+    def close(self):
+        pass
+
+    def fileno(self) -> Optional[int]:
+        return None
+
+    def handle_readable(self):
+        pass
+
+    @abstractmethod
+    def read(self) -> bool:
+        raise NotImplemented
+
+    def refresh(self):
+        self._update(self.read())
+
+    def _update(self, is_closed: bool):
+        if is_closed == self._is_closed:
+            return
+        self._is_closed = is_closed
+        for listener in self._listeners:
+            listener(is_closed)
+
+
+class StaticLidStateProvider(LidStateProvider):
+    def __init__(self, is_closed: bool = False):
+        super().__init__()
+        self._state = is_closed
+
+    def read(self) -> bool:
+        return self._state
+
+
+class ProcfsLidStateProvider(LidStateProvider):
+    def __init__(self, location: str = None):
+        super().__init__()
+        locations = [location] if location is not None else sorted(glob('/proc/acpi/button/lid/*/state'))
+        if not locations:
+            raise FileNotFoundError('No lid state was found in /proc/acpi/button/lid')
+        self._location = locations[0]
+
+    @property
+    def location(self) -> str:
+        return self._location
+
+    def read(self) -> bool:
+        with open(self._location, 'r') as file_handle:
+            return file_handle.read().split(':')[1].strip() == 'closed'
+
+
+class EvdevLidStateProvider(LidStateProvider):
+    _fd: int
+
+    def __init__(self, device: str = None, fd: int = None):
+        super().__init__()
+        self._device = device
+        if fd is not None:
+            self._fd = fd
+        else:
+            devices = [device] if device is not None else self._find_devices()
+            if not devices:
+                raise FileNotFoundError('No input device with a lid switch was found')
+            self._device = devices[0]
+            self._fd = os_open(self._device, O_RDONLY | O_NONBLOCK)
+
+    @property
+    def device(self) -> Optional[str]:
+        return self._device
+
+    def close(self):
+        close(self._fd)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def handle_readable(self):
+        size = calcsize(INPUT_EVENT)
+        try:
+            data = read(self._fd, size * 64)
+        except BlockingIOError:
+            return
+        for _, _, event_type, code, value in iter_unpack(INPUT_EVENT, data[:len(data) - len(data) % size]):
+            if event_type == EV_SW and code == SW_LID:
+                self._update(value != 0)
+
+    def read(self) -> bool:
+        switches = bytearray(8)
+        ioctl(self._fd, _eviocgsw(len(switches)), switches)
+        return bool(switches[0] >> SW_LID & 1)
+
+    def _find_devices(self) -> List[str]:
+        devices = []
+        for capabilities in sorted(glob('/sys/class/input/event*/device/capabilities/sw')):
+            with open(capabilities, 'r') as file_handle:
+                words = file_handle.read().split()
+            if words and int(words[-1], 16) >> SW_LID & 1:
+                devices.append(f'/dev/input/{capabilities.split("/")[4]}')
+        return devices
+
+
+class AcpidLidStateProvider(LidStateProvider):
+    _buffer: bytes
+    _fallback: Optional[LidStateProvider]
+    _socket: socket
+
+    def __init__(self, location: str = None, fallback: LidStateProvider = None, connection: socket = None):
+        super().__init__()
+        self._buffer = b''
+        self._fallback = fallback
+        if connection is not None:
+            self._socket = connection
+        else:
+            self._socket = socket(AF_UNIX, SOCK_STREAM)
+            try:
+                self._socket.connect(location or _acpid_location)
+            except OSError:
+                self._socket.close()
+                raise
+        self._socket.setblocking(False)
+
+    def close(self):
+        self._socket.close()
+
+    def fileno(self) -> int:
+        return self._socket.fileno()
+
+    def handle_readable(self):
+        try:
+            data = self._socket.recv(4096)
+        except BlockingIOError:
+            return
+        *lines, self._buffer = (self._buffer + data).split(b'\n')
+        for line in lines:
+            # Events look like "button/lid LID close", the device name varies between machines.
+            parts = line.decode('ascii', 'replace').split()
+            if len(parts) >= 3 and parts[0] == 'button/lid' and parts[2] in ('open', 'close'):
+                self._update(parts[2] == 'close')
+
+    def read(self) -> bool:
+        # acpid only reports changes, the current state has to come from elsewhere.
+        return self._fallback.read() if self._fallback is not None else False
+
+
+def get_lid_state_provider() -> LidStateProvider:
+    try:
+        procfs = ProcfsLidStateProvider()
+    except FileNotFoundError:
+        procfs = None
+    try:
+        return EvdevLidStateProvider()
+    except OSError:
+        pass
+    try:
+        return AcpidLidStateProvider(fallback=procfs)
+    except OSError:
+        pass
+    return procfs if procfs is not None else StaticLidStateProvider()
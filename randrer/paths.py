@@ -0,0 +1,28 @@
+from os import environ, getuid, lstat, makedirs
+from stat import S_IMODE, S_ISDIR
+from tempfile import gettempdir
+
+
+def get_display_key(display: str = None) -> str:
+    # Resolved like Xlib does, so :0, :0.0 and unix:0 share the files of the screen they name. The screens of one X
+    # server are configured separately, each keeps its own files.
+    name = display or environ.get('DISPLAY')
+    if not name:
+        return 'default'
+    host, _, number = name.rpartition(':')
+    number, _, screen = number.partition('.')
+    host = '' if host == 'unix' else host
+    return f'{host}:{number}.{screen or 0}'.replace('/', '_')
+
+
+def get_runtime_directory() -> str:
+    runtime_directory = environ.get('XDG_RUNTIME_DIR')
+    location = f'{runtime_directory}/randrer' if runtime_directory else f'{gettempdir()}/randrer-{getuid()}'
+    makedirs(location, mode=0o700, exist_ok=True)
+    # The temporary directory is shared, another user may have created this directory first to own the sockets in it.
+    status = lstat(location)
+    if not S_ISDIR(status.st_mode) or status.st_uid != getuid() or S_IMODE(status.st_mode) != 0o700:
+        raise PermissionError(
+            f'Refusing to use {location}, it must be a directory owned by the current user with mode 700'
+        )
+    return location
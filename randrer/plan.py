@@ -0,0 +1,168 @@
+from typing import NamedTuple, List, Dict, Optional, Union
+
+from Xlib.ext.randr import Rotate_0, Rotate_90, Rotate_270, SetConfigSuccess, SetConfigInvalidConfigTime, \
+    SetConfigInvalidTime, SetConfigFailed
+
+from randrer.screen_resources import Crtc, Mode
+
+
+class CrtcChange(NamedTuple):
+    crtc: int
+    x: int
+    y: int
+    mode: int
+    rotation: int
+    outputs: List[int]
+
+    @classmethod
+    def from_crtc(cls, crtc: Crtc) -> 'CrtcChange':
+        return cls(crtc.id, crtc.x, crtc.y, crtc.mode, crtc.rotation, sorted(crtc.outputs))
+
+    @classmethod
+    def disabled(cls, crtc_id: int) -> 'CrtcChange':
+        return cls(crtc_id, 0, 0, 0, Rotate_0, [])
+
+    @property
+    def is_disabled(self) -> bool:
+        return self.mode == 0
+
+    def is_equivalent(self, other: 'CrtcChange') -> bool:
+        if self.is_disabled and other.is_disabled:
+            return self.crtc == other.crtc
+        return self == other
+
+
+class ScreenSize(NamedTuple):
+    width: int
+    height: int
+    width_mm: int
+    height_mm: int
+
+
+class CommitPlan(NamedTuple):
+    disable: List[CrtcChange]
+    screen_size: Optional[ScreenSize]
+    configure: List[CrtcChange]
+
+    @property
+    def crtc_changes(self) -> List[CrtcChange]:
+        return [*self.disable, *self.configure]
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.disable and self.screen_size is None and not self.configure
+
+    @property
+    def modeset_count(self) -> int:
+        return len(self.disable) + len(self.configure)
+
+    @property
+    def requests(self) -> List[Union[CrtcChange, ScreenSize]]:
+        screen_size = [self.screen_size] if self.screen_size is not None else []
+        return [*self.disable, *screen_size, *self.configure]
+
+    def predict_crtcs(self, crtcs: Dict[int, Crtc], modes: Dict[int, Mode]) -> Dict[int, Crtc]:
+        predicted = dict(crtcs)
+        for change in [*self.disable, *self.configure]:
+            crtc = crtcs.get(change.crtc)
+            width, height = 0, 0
+            mode = modes.get(change.mode)
+            if mode is not None:
+                width, height = mode.width, mode.height
+                if change.rotation & (Rotate_90 | Rotate_270):
+                    width, height = height, width
+            predicted[change.crtc] = Crtc(
+                change.crtc,
+                change.mode,
+                crtc.possible_outputs if crtc is not None else [],
+                change.outputs,
+                change.rotation,
+                width,
+                height,
+                change.x,
+                change.y
+            )
+        return predicted
+
+
+class CrtcResult(NamedTuple):
+    change: CrtcChange
+    status: Optional[int]
+    error: Optional[str] = None
+
+    @classmethod
+    def from_status(cls, change: CrtcChange, status: int) -> 'CrtcResult':
+        statuses = {
+            SetConfigInvalidConfigTime: 'invalid config time',
+            SetConfigInvalidTime: 'invalid time',
+            SetConfigFailed: 'failed'
+        }
+        return cls(change, status, statuses.get(status, f'status {status}') if status != SetConfigSuccess else None)
+
+    @property
+    def is_successful(self) -> bool:
+        return self.error is None
+
+
+class CommitResult(NamedTuple):
+    plan: CommitPlan
+    results: List[CrtcResult]
+
+    @property
+    def applied(self) -> CommitPlan:
+        plan = self.plan
+        disable_count = len(plan.disable)
+        return CommitPlan(
+            [result.change for result in self.results[:disable_count] if result.is_successful],
+            plan.screen_size,
+            [result.change for result in self.results[disable_count:] if result.is_successful]
+        )
+
+    @property
+    def failed(self) -> List[CrtcResult]:
+        return [result for result in self.results if not result.is_successful]
+
+    @property
+    def is_successful(self) -> bool:
+        return not self.failed
+
+    def describe_failures(self) -> str:
+        return ', '.join(f'CRTC {result.change.crtc} ({result.error})' for result in self.failed)
+
+
+class CommitPlanner:
+    _crtcs: Dict[int, Crtc]
+    _screen_size: ScreenSize
+
+    def __init__(self, crtcs: Dict[int, Crtc], screen_size: ScreenSize):
+        self._crtcs = crtcs
+        self._screen_size = screen_size
+
+    def plan(self, targets: List[CrtcChange], screen_size: ScreenSize) -> CommitPlan:
+        crtcs = self._crtcs
+        disable = [
+            CrtcChange.disabled(crtc.id) for crtc in crtcs.values()
+            if crtc.mode != 0 and not self._fits(crtc, screen_size)
+        ]
+        disabled_crtcs = {change.crtc for change in disable}
+        configure = []
+        for target in targets:
+            crtc = crtcs.get(target.crtc)
+            if crtc is None or target.crtc in disabled_crtcs:
+                current = CrtcChange.disabled(target.crtc)
+            else:
+                current = CrtcChange.from_crtc(crtc)
+            if current.is_equivalent(target):
+                continue
+            if target.is_disabled:
+                disable.append(target)
+            else:
+                configure.append(target)
+        return CommitPlan(
+            disable,
+            screen_size if screen_size != self._screen_size else None,
+            configure
+        )
+
+    def _fits(self, crtc: Crtc, screen_size: ScreenSize) -> bool:
+        return crtc.x + crtc.width <= screen_size.width and crtc.y + crtc.height <= screen_size.height
@@ -0,0 +1,174 @@
+from contextlib import contextmanager
+from json import dump
+from os import getpid
+from time import perf_counter
+from typing import NamedTuple, List, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from randrer.randr_adapter import RandrAdapter
+
+
+class RequestRecord(NamedTuple):
+    kind: str
+    arguments: Dict
+    start: float
+    end: float
+    request_bytes: int
+    reply_items: int
+    status: Optional[str]
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class PhaseRecord(NamedTuple):
+    name: str
+    start: float
+    end: float
+
+
+class RequestProfiler:
+    phases: List[PhaseRecord]
+    records: List[RequestRecord]
+    _origin: float
+
+    def __init__(self):
+        self.phases = []
+        self.records = []
+        self._origin = perf_counter()
+
+    def attach(self, adapter: 'RandrAdapter'):
+        request = adapter.request
+        get_geometry = adapter.get_geometry
+
+        def profiled_request(request_type, **keys):
+            return self._profile(request_type.__name__, keys, lambda: request(request_type, **keys))
+
+        def profiled_get_geometry(defer: bool = False):
+            return self._profile('GetGeometry', {'defer': defer}, lambda: get_geometry(defer))
+
+        adapter.request = profiled_request
+        adapter.get_geometry = profiled_get_geometry
+        adapter.profiler = self
+
+    def format_summary(self) -> str:
+        lines = [f'{"request":<28}{"count":>7}{"total ms":>11}{"p50 ms":>10}{"p99 ms":>10}']
+        for kind, summary in self.get_summary().items():
+            lines.append(
+                f'{kind:<28}{summary["count"]:>7}{summary["total_ms"]:>11.3f}{summary["p50_ms"]:>10.3f}'
+                f'{summary["p99_ms"]:>10.3f}'
+            )
+        for phase in self.phases:
+            lines.append(f'phase {phase.name:<22}{"":>7}{(phase.end - phase.start) * 1000:>11.3f}')
+        return '\n'.join(lines)
+
+    def get_summary(self) -> Dict[str, Dict]:
+        durations = {}
+        for record in self.records:
+            durations.setdefault(record.kind, []).append(record.duration * 1000)
+        return {
+            kind: {
+                'count': len(values),
+                'total_ms': sum(values),
+                'p50_ms': self._percentile(sorted(values), 50),
+                'p99_ms': self._percentile(sorted(values), 99),
+            }
+            for kind, values in durations.items()
+        }
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append(PhaseRecord(name, start, perf_counter()))
+
+    def write_trace(self, location: str):
+        pid = getpid()
+        events = [
+            {
+                'name': phase.name,
+                'cat': 'phase',
+                'ph': 'X',
+                'ts': self._microseconds(phase.start),
+                'dur': self._microseconds(phase.end) - self._microseconds(phase.start),
+                'pid': pid,
+                'tid': 0,
+            }
+            for phase in self.phases
+        ]
+        events.extend(
+            {
+                'name': record.kind,
+                'cat': 'request',
+                'ph': 'X',
+                'ts': self._microseconds(record.start),
+                'dur': self._microseconds(record.end) - self._microseconds(record.start),
+                'pid': pid,
+                'tid': 1,
+                'args': {
+                    **record.arguments,
+                    'request_bytes': record.request_bytes,
+                    'reply_items': record.reply_items,
+                    'status': record.status,
+                },
+            }
+            for record in self.records
+        )
+        with open(location, 'w') as file_handle:
+            dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file_handle)
+
+    def _microseconds(self, timestamp: float) -> float:
+        return (timestamp - self._origin) * 1e6
+
+    def _percentile(self, values: List[float], percentile: int) -> float:
+        index = max(0, -(-len(values) * percentile // 100) - 1)
+        return values[index]
+
+    def _profile(self, kind: str, keys: Dict, send):
+        start = perf_counter()
+        try:
+            result = send()
+        except Exception as e:
+            self._record(kind, keys, start, None, type(e).__name__)
+            raise
+        if not keys.get('defer'):
+            self._record(kind, keys, start, result)
+            return result
+        reply = result.reply
+        recorded = []
+
+        def profiled_reply():
+            try:
+                reply()
+            finally:
+                if not recorded:
+                    recorded.append(True)
+                    self._record(kind, keys, start, result)
+
+        result.reply = profiled_reply
+        return result
+
+    def _record(self, kind: str, keys: Dict, start: float, result, status: str = None):
+        data = getattr(result, '_data', None)
+        if not isinstance(data, dict):
+            data = {key: value for key, value in vars(result).items() if not key.startswith('_')} \
+                if hasattr(result, '__dict__') else {}
+        if status is None and data.get('status') is not None:
+            status = str(data.get('status'))
+        self.records.append(
+            RequestRecord(
+                kind,
+                {
+                    key: value if isinstance(value, (int, str, list)) else str(value)
+                    for key, value in keys.items() if key != 'defer'
+                },
+                start,
+                perf_counter(),
+                len(getattr(result, '_binary', b'')),
+                sum(len(value) for value in data.values() if isinstance(value, (list, str, bytes))),
+                status
+            )
+        )
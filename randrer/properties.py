@@ -0,0 +1,63 @@
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from Xlib.ext.randr import GetOutputProperty, RRNotify_OutputChange, RRNotify_OutputProperty
+
+from randrer.randr_adapter import RandrAdapter
+
+
+class OutputPropertyCache:
+    _adapter: RandrAdapter
+    _atoms: Dict[str, int]
+    _parsers: Dict[str, Callable[[bytes], Any]]
+    _values: Dict[Tuple[int, str], Any]
+
+    def __init__(self, adapter: RandrAdapter, parsers: Dict[str, Callable[[bytes], Any]]):
+        self._adapter = adapter
+        self._atoms = {}
+        self._parsers = parsers
+        self._values = {}
+
+    def get(self, output_id: int, name: str):
+        return self._values.get((output_id, name))
+
+    def handle_event(self, event):
+        sub_code = getattr(event, 'sub_code', None)
+        if sub_code == RRNotify_OutputChange:
+            self.invalidate(event.output)
+        elif sub_code == RRNotify_OutputProperty:
+            names = [name for name, atom in self._atoms.items() if atom == event.atom]
+            for name in names:
+                self.invalidate(event.output, name)
+
+    def invalidate(self, output_id: int, name: str = None):
+        for key in [key for key in self._values if key[0] == output_id and name in (None, key[1])]:
+            del self._values[key]
+
+    def request(self, output_ids: Iterable[int]) -> Dict[Tuple[int, str], GetOutputProperty]:
+        adapter = self._adapter
+        pending = {}
+        for name in self._parsers:
+            atom = self._get_atom(name)
+            for output_id in output_ids:
+                if (output_id, name) in self._values:
+                    continue
+                if not atom:
+                    self._values[output_id, name] = None
+                    continue
+                pending[output_id, name] = adapter.get_output_property(output_id, atom, defer=True)
+        return pending
+
+    def store(self, pending: Dict[Tuple[int, str], GetOutputProperty]):
+        for (output_id, name), reply in pending.items():
+            reply.reply()
+            value = bytes(reply.value)
+            self._values[output_id, name] = self._parsers[name](value) if value else None
+
+    def _get_atom(self, name: str) -> int:
+        atom = self._atoms.get(name)
+        if atom is None:
+            # An atom that does not exist yet is looked up again, it is created once a monitor reports that property.
+            atom = self._adapter.get_atom(name)
+            if atom:
+                self._atoms[name] = atom
+        return atom
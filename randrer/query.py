@@ -0,0 +1,121 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from Xlib.ext.randr import Connected, Disconnected
+
+from randrer.edid import EdidFingerprint
+from randrer.randr_adapter import RandrAdapter
+from randrer.screen_resources import Crtc, Mode
+from randrer.snapshot import ResourceSnapshot
+
+FIELDS = ('name', 'connection', 'mode', 'position', 'refresh', 'edid')
+_crtc_fields = {'mode', 'position', 'refresh'}
+
+
+class OutputStatus(NamedTuple):
+    name: str
+    connection: str
+    is_active: bool
+    mode: Optional[str] = None
+    position: Optional[Tuple[int, int]] = None
+    refresh: Optional[float] = None
+    edid: Optional[str] = None
+
+    @classmethod
+    def create(
+            cls,
+            name: str,
+            connection: int,
+            crtc: Optional[Crtc],
+            modes: Dict[int, Mode],
+            fingerprint: Optional[str]
+    ) -> 'OutputStatus':
+        connection = 'connected' if connection == Connected else 'disconnected' if connection == Disconnected \
+            else 'unknown'
+        mode = modes.get(crtc.mode) if crtc is not None else None
+        if mode is None:
+            return cls(name, connection, False, edid=fingerprint)
+        # An output that was unplugged keeps its CRTC until it is configured again, it is not active any more.
+        is_active = connection == 'connected'
+        return cls(name, connection, is_active, mode.name, (crtc.x, crtc.y), round(mode.refresh, 2), fingerprint)
+
+    def format(self, fields: Iterable[str]) -> str:
+        values = {
+            **self._asdict(),
+            'position': f'+{self.position[0]}+{self.position[1]}' if self.position is not None else None
+        }
+        return '\t'.join('-' if values[field] is None else str(values[field]) for field in fields)
+
+    def to_dict(self, fields: Iterable[str]) -> Dict:
+        return {field: getattr(self, field) for field in fields}
+
+
+class OutputQuery:
+    _adapter: RandrAdapter
+
+    def __init__(self, adapter: RandrAdapter):
+        self._adapter = adapter
+
+    @classmethod
+    def from_snapshot(cls, snapshot: ResourceSnapshot) -> List[OutputStatus]:
+        modes = {mode.id: mode for mode in snapshot.modes}
+        crtcs = {crtc.id: crtc for crtc in snapshot.crtcs}
+        return [
+            OutputStatus.create(output.name, output.connection, crtcs.get(output.crtc), modes, output.fingerprint)
+            for output in snapshot.outputs
+        ]
+
+    def query(self, fields: Iterable[str], probe: bool = False) -> List[OutputStatus]:
+        adapter = self._adapter
+        fields = set(fields)
+        resources = adapter.get_screen_resources() if probe else adapter.get_screen_resources_current()
+        atom = adapter.get_atom('EDID') if 'edid' in fields else 0
+        # Only the requests the fields need are sent, and they are queued together so the batch is a single round
+        # trip. A handful of CRTCs is cheaper to fetch outright than to wait for the outputs to name them.
+        output_infos = {output_id: adapter.get_output_info(output_id, defer=True) for output_id in resources.outputs}
+        crtc_infos = {crtc_id: adapter.get_crtc_info(crtc_id, defer=True) for crtc_id in resources.crtcs} \
+            if fields & _crtc_fields else {}
+        edids = {
+            output_id: adapter.get_output_property(output_id, atom, defer=True) for output_id in resources.outputs
+        } if atom else {}
+        for reply in [*output_infos.values(), *crtc_infos.values(), *edids.values()]:
+            reply.reply()
+        modes = self._parse_modes(resources.modes, resources.mode_names) if crtc_infos else {}
+        crtcs = {
+            crtc_id: Crtc(
+                crtc_id,
+                info.mode,
+                info.possible_outputs,
+                info.outputs,
+                info.rotation,
+                info.width,
+                info.height,
+                info.x,
+                info.y
+            )
+            for crtc_id, info in crtc_infos.items()
+        }
+        statuses = []
+        for output_id, info in output_infos.items():
+            edid = bytes(edids[output_id].value) if output_id in edids else b''
+            fingerprint = EdidFingerprint.from_edid(edid) if edid else None
+            # Without CRTC infos the output's CRTC still tells whether it is active.
+            crtc = crtcs.get(info.crtc) if crtc_infos else None
+            status = OutputStatus.create(
+                info.name,
+                info.connection,
+                crtc,
+                modes,
+                str(fingerprint) if fingerprint is not None else None
+            )
+            statuses.append(
+                status if crtc_infos else status._replace(is_active=info.connection == Connected and info.crtc != 0)
+            )
+        return statuses
+
+    def _parse_modes(self, modes: Iterable, mode_names: str) -> Dict[int, Mode]:
+        parsed = {}
+        name_index = 0
+        for mode in modes:
+            parsed[mode.id] = Mode.from_info(mode, mode_names[name_index:name_index + mode.name_length])
+            name_index += mode.name_length
+        return parsed
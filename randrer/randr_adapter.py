@@ -1,26 +1,63 @@
 from time import time
-from typing import List
+from typing import List, Dict, Iterable, Tuple, Optional, Type, Union, TYPE_CHECKING
 
+from Xlib.X import AnyPropertyType
 from Xlib.display import Display
+from Xlib.error import XError
 from Xlib.ext.randr import extname, GetOutputPrimary, GetScreenInfo, GetScreenResources, GetScreenResourcesCurrent, \
-    GetCrtcInfo, GetCrtcTransform, GetOutputInfo, GetPanning, ListOutputProperties, QueryOutputProperty, SetCrtcConfig, \
-    SetPanning, _1_0SetScreenConfig, SetScreenSize
+    GetCrtcInfo, GetCrtcTransform, GetOutputInfo, GetOutputProperty, GetPanning, ListOutputProperties, \
+    QueryOutputProperty, SelectInput, SetConfigInvalidConfigTime, SetCrtcConfig, SetPanning, \
+    _1_0SetScreenConfig, SetScreenSize
+from Xlib.protocol.display import Display as ProtocolDisplay
+from Xlib.protocol.request import GetGeometry
+from Xlib.protocol.rq import Request, ReplyRequest
 from Xlib.xobject.drawable import Window
 
+from randrer.plan import CommitPlan, CommitResult, CrtcChange, CrtcResult
+
+if TYPE_CHECKING:
+    from randrer.profiler import RequestProfiler
+
 
 class RandrAdapter:
+    config_retries: int = 2
     display: Display
+    profiler: Optional['RequestProfiler'] = None
     window: Window
+    _config_timestamp: Optional[int]
+    _opcode: Optional[int]
+    _protocol_display: ProtocolDisplay
+    _screen_size_mm: Optional[Tuple[int, int]]
 
     def __init__(self, display: Display):
         self.display = display
         screen = display.screen()
         self.window = screen.root
+        self._protocol_display = self.window.display
+        self._config_timestamp = None
+        self._opcode = None
+        self._screen_size_mm = None
+
+    @property
+    def config_timestamp(self) -> int:
+        if self._config_timestamp is None:
+            self.get_screen_resources_current()
+        return self._config_timestamp
+
+    @config_timestamp.setter
+    def config_timestamp(self, config_timestamp: int):
+        self._config_timestamp = config_timestamp
 
     @property
     def extension_name(self):
         return extname
 
+    @property
+    def opcode(self) -> int:
+        if self._opcode is None:
+            self._opcode = self._protocol_display.get_extension_major(extname)
+        return self._opcode
+
     @property
     def screen_size(self):
         screen = self.display.screen()
@@ -28,96 +65,177 @@ class RandrAdapter:
 
     @property
     def screen_size_mm(self):
+        if self._screen_size_mm is not None:
+            return self._screen_size_mm
         screen = self.display.screen()
         return screen.width_in_mms, screen.height_in_mms
 
+    def commit(self, plan: CommitPlan) -> CommitResult:
+        crtc_changes = plan.crtc_changes
+        results = {}
+        indices = None
+        for _ in range(self.config_retries + 1):
+            replies = self.queue_commit(plan, indices)
+            results.update(
+                {index: self.get_crtc_result(crtc_changes[index], reply) for index, reply in replies.items()}
+            )
+            indices = [index for index, result in results.items() if result.status == SetConfigInvalidConfigTime]
+            if not indices:
+                break
+            self.get_screen_resources_current()
+        return CommitResult(plan, [results[index] for index in sorted(results)])
+
+    def fileno(self) -> int:
+        return self.display.fileno()
+
+    def get_atom(self, name: str) -> int:
+        return self.display.get_atom(name, only_if_exists=True)
+
+    def get_geometry(self, defer: bool = False):
+        return GetGeometry(display=self._protocol_display, defer=defer, drawable=self.window)
+
     def get_primary_output(self):
-        return GetOutputPrimary(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(self.extension_name),
-            window=self.window
-        )
+        return self.request(GetOutputPrimary, window=self.window)
 
     def get_screen_info(self):
-        return GetScreenInfo(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(self.extension_name),
-            window=self.window
-        )
+        return self.request(GetScreenInfo, window=self.window)
 
     def get_screen_resources(self):
-        return GetScreenResources(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(self.extension_name),
-            window=self.window
-        )
+        resources = self.request(GetScreenResources, window=self.window)
+        self._config_timestamp = resources.config_timestamp
+        return resources
 
     def get_screen_resources_current(self):
-        return GetScreenResourcesCurrent(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(extname),
-            window=self.window,
-        )
+        resources = self.request(GetScreenResourcesCurrent, window=self.window)
+        self._config_timestamp = resources.config_timestamp
+        return resources
 
-    def get_crtc_info(self, crtc_id: int):
-        return GetCrtcInfo(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(self.extension_name),
+    def get_crtc_info(self, crtc_id: int, defer: bool = False):
+        return self.request(
+            GetCrtcInfo,
+            defer=defer,
             crtc=crtc_id,
             config_timestamp=0
         )
 
+    def get_crtc_infos(self, crtc_ids: Iterable[int]) -> Dict[int, GetCrtcInfo]:
+        crtc_infos, _ = self.get_resource_infos(crtc_ids, ())
+        return crtc_infos
+
+    def get_crtc_result(self, change: CrtcChange, reply: SetCrtcConfig) -> CrtcResult:
+        try:
+            reply.reply()
+        except XError as e:
+            return CrtcResult(change, None, str(e))
+        return CrtcResult.from_status(change, reply.status)
+
     def get_crtc_transform(self, crtc_id: int):
-        return GetCrtcTransform(
-            display=self.display.display,
-            opcode=self.display.display.get_extension_major(extname),
-            crtc=crtc_id,
-        )
+        return self.request(GetCrtcTransform, crtc=crtc_id)
 
-    def get_output_info(self, output_id: int):
-        return GetOutputInfo(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(self.extension_name),
+    def get_output_info(self, output_id: int, defer: bool = False):
+        return self.request(
+            GetOutputInfo,
+            defer=defer,
             output=output_id,
             config_timestamp=0
         )
 
-    def get_panning(self, crtc_id: int):
-        return GetPanning(
-            display=self.display.display,
-            opcode=self.display.display.get_extension_major(extname),
-            crtc=crtc_id,
-        )
+    def get_output_infos(self, output_ids: Iterable[int]) -> Dict[int, GetOutputInfo]:
+        _, output_infos = self.get_resource_infos((), output_ids)
+        return output_infos
 
-    def list_output_properties(self, output_id: int):
-        return ListOutputProperties(
-            display=self.display.display,
-            opcode=self.display.display.get_extension_major(extname),
+    def get_output_property(self, output_id: int, atom: int, long_length: int = 32, defer: bool = False):
+        return self.request(
+            GetOutputProperty,
+            defer=defer,
             output=output_id,
+            property=atom,
+            type=AnyPropertyType,
+            long_offset=0,
+            long_length=long_length,
+            delete=False,
+            pending=False
         )
 
+    def get_resource_infos(
+            self,
+            crtc_ids: Iterable[int],
+            output_ids: Iterable[int]
+    ) -> Tuple[Dict[int, GetCrtcInfo], Dict[int, GetOutputInfo]]:
+        # Every request is queued before any reply is read, so the whole batch costs a single round trip.
+        crtc_infos = {crtc_id: self.get_crtc_info(crtc_id, defer=True) for crtc_id in crtc_ids}
+        output_infos = {output_id: self.get_output_info(output_id, defer=True) for output_id in output_ids}
+        for info in [*crtc_infos.values(), *output_infos.values()]:
+            info.reply()
+        return crtc_infos, output_infos
+
+    def get_panning(self, crtc_id: int):
+        return self.request(GetPanning, crtc=crtc_id)
+
+    def is_replied(self, reply: ReplyRequest) -> bool:
+        return reply._data is not None or reply._error is not None
+
+    def list_output_properties(self, output_id: int):
+        return self.request(ListOutputProperties, output=output_id)
+
     def query_output_property(self, output_id, atom):
-        return QueryOutputProperty(
-            display=self.display.display,
-            opcode=self.display.display.get_extension_major(extname),
-            output=output_id,
-            property=atom,
-        )
+        return self.request(QueryOutputProperty, output=output_id, property=atom)
+
+    def queue_commit(self, plan: CommitPlan, indices: List[int] = None) -> Dict[int, SetCrtcConfig]:
+        # Every change is sent before any status is read, so the batch costs a single round trip. The server applies
+        # them in order, the same as if each status had been awaited. Retried changes leave the screen size alone.
+        crtc_changes = plan.crtc_changes
+        disable_count = len(plan.disable)
+        screen_size = plan.screen_size if indices is None else None
+        replies = {}
+        for index in range(len(crtc_changes)) if indices is None else indices:
+            if screen_size is not None and index >= disable_count:
+                self.set_screen_size(*screen_size)
+                screen_size = None
+            change = crtc_changes[index]
+            replies[index] = self.request(
+                SetCrtcConfig,
+                defer=True,
+                crtc=change.crtc,
+                config_timestamp=self.config_timestamp,
+                x=change.x,
+                y=change.y,
+                mode=change.mode,
+                rotation=change.rotation,
+                outputs=change.outputs,
+                timestamp=int(time())
+            )
+        screen_size is not None and self.set_screen_size(*screen_size)
+        self.display.flush()
+        return replies
+
+    def receive_pending(self) -> int:
+        return self.display.pending_events()
+
+    def request(self, request_type: Type[Union[Request, ReplyRequest]], **keys):
+        return request_type(display=self._protocol_display, opcode=self.opcode, **keys)
+
+    def select_input(self, mask: int):
+        return self.request(SelectInput, window=self.window, mask=mask)
 
     def set_crtc_config(self, crtc_id: int, x: int, y: int, mode: int, rotation: int, outputs: List[int]):
-        current_info = self.get_crtc_info(crtc_id)
-        return SetCrtcConfig(
-            display=self.display.display,
-            opcode=self.display.display.get_extension_major(extname),
-            crtc=crtc_id,
-            config_timestamp=current_info.timestamp,
-            x=x,
-            y=y,
-            mode=mode,
-            rotation=rotation,
-            outputs=outputs,
-            timestamp=int(time())
-        )
+        reply = None
+        for _ in range(self.config_retries + 1):
+            reply = self.request(
+                SetCrtcConfig,
+                crtc=crtc_id,
+                config_timestamp=self.config_timestamp,
+                x=x,
+                y=y,
+                mode=mode,
+                rotation=rotation,
+                outputs=outputs,
+                timestamp=int(time())
+            )
+            if reply.status != SetConfigInvalidConfigTime:
+                break
+            self.get_screen_resources_current()
+        return reply
 
     def set_panning(
             self,
@@ -136,9 +254,8 @@ class RandrAdapter:
             border_bottom: int = None
     ):
         current_panning = self.get_panning(crtc_id)
-        return SetPanning(
-            display=self.display.display,
-            opcode=self.display.display.get_extension_major(extname),
+        return self.request(
+            SetPanning,
             crtc=crtc_id,
             left=left if left is not None else current_panning.left,
             top=top if top is not None else current_panning.top,
@@ -157,9 +274,8 @@ class RandrAdapter:
 
     def set_screen_config(self, size_id: int, rotation: int, rate: int = 0):
         info = self.get_screen_info()
-        return _1_0SetScreenConfig(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(extname),
+        return self.request(
+            _1_0SetScreenConfig,
             drawable=self.window,
             timestamp=int(time()),
             config_timestamp=info.config_timestamp,
@@ -174,9 +290,10 @@ class RandrAdapter:
             width_in_millimeters: int = None,
             height_in_millimeters: int = None
     ):
-        return SetScreenSize(
-            display=self.window.display,
-            opcode=self.window.display.get_extension_major(extname),
+        if width_in_millimeters is not None and height_in_millimeters is not None:
+            self._screen_size_mm = width_in_millimeters, height_in_millimeters
+        return self.request(
+            SetScreenSize,
             window=self.window,
             width=width,
             height=height,
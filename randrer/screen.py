@@ -1,33 +1,75 @@
-from typing import List, Dict, Iterator, Type
+from contextlib import nullcontext
+from time import perf_counter
+from typing import List, Dict, Iterator, Type, Optional, Tuple
 
-from Xlib.ext.randr import Rotate_0
+from Xlib.ext.randr import GetCrtcInfo, GetOutputInfo, GetOutputProperty, GetScreenResources
+from Xlib.protocol.request import GetGeometry
 from Xlib.protocol.rq import DictWrapper
 
 from randrer.config import Configuration
+from randrer.edid import EdidFingerprint
 from randrer.layout import Layout, LinearLayout, LayoutInterface, LaptopLidLayoutDecorator, Arrangement
+from randrer.layout_cache import LayoutCache, LayoutEntry
+from randrer.lid import LidStateProvider, get_lid_state_provider
+from randrer.plan import CommitPlan, CommitPlanner, CommitResult, CrtcChange, ScreenSize
+from randrer.properties import OutputPropertyCache
 from randrer.randr_adapter import RandrAdapter
-from randrer.screen_resources import Crtc, Output, Mode
+from randrer.screen_resources import Crtc, Output, Mode, OutputIndex
+from randrer.snapshot import ScreenSnapshot, ResourceSnapshot, OutputSnapshot
 
 
 class ScreenManager:
     _adapter: RandrAdapter
     _available_modes: Dict[int, Mode]
+    _baseline: Tuple[Dict[int, Crtc], ScreenSize]
     _config: Configuration
+    _config_timestamp: int
+    _grab_duration: Optional[float]
     _crtcs: Dict[int, Crtc]
     _outputs: Dict[int, Output]
+    _is_probed: bool
+    _is_stale: bool
+    _screen_size: ScreenSize
+    _timestamp: int
     _pending_arrangements: List[Arrangement]
+    _restore_plan: Optional[CommitPlan]
     _layout_managers: Dict[str, Type[Layout]]
+    _layout_cache: Optional[LayoutCache]
+    _layout_key: Optional[Tuple]
+    _pending_layout: Optional[Tuple[Optional[Tuple], List[CrtcChange], ScreenSize]]
+    _lid_state: Optional[LidStateProvider]
+    _owned_lid_state: Optional[LidStateProvider]
+    _properties: OutputPropertyCache
 
-    def __init__(self, adapter: RandrAdapter, config: Configuration):
+    def __init__(
+            self,
+            adapter: RandrAdapter,
+            config: Configuration,
+            probe: bool = False,
+            lid_state: LidStateProvider = None,
+            layout_cache: LayoutCache = None,
+            discover: bool = True
+    ):
         self._adapter = adapter
         self._config = config
-        resources = adapter.get_screen_resources()
-        self._available_modes = dict(self._parse_modes(resources.modes, resources.mode_names))
-        self._crtcs = dict(self._parse_crtcs(resources.crtcs))
-        self._outputs = dict(self._parse_outputs(resources.outputs))
+        self._lid_state = lid_state
+        self._owned_lid_state = None
+        self._layout_cache = layout_cache
+        self._layout_key = None
+        self._pending_layout = None
         self._layout_managers = {
             'linear': LinearLayout
         }
+        self._grab_duration = None
+        self._properties = OutputPropertyCache(adapter, {'EDID': EdidFingerprint.from_edid})
+        self._available_modes = {}
+        self._crtcs = {}
+        self._outputs = {}
+        self._screen_size = None
+        self._is_probed = False
+        self._is_stale = True
+        self._restore_plan = None
+        discover and self._discover(probe)
 
     @property
     def adapter(self) -> RandrAdapter:
@@ -41,20 +83,99 @@ class ScreenManager:
     def config(self) -> Configuration:
         return self._config
 
+    @config.setter
+    def config(self, config: Optional[Configuration]):
+        self._config = config
+
+    @property
+    def config_timestamp(self) -> int:
+        return self._config_timestamp
+
     @property
     def crtcs(self) -> Dict[int, Crtc]:
         return self._crtcs
 
+    @property
+    def grab_duration(self) -> Optional[float]:
+        return self._grab_duration
+
+    @property
+    def is_probed(self) -> bool:
+        return self._is_probed
+
+    @property
+    def is_stale(self) -> bool:
+        return self._is_stale
+
+    @property
+    def layout_cache(self) -> Optional[LayoutCache]:
+        return self._layout_cache
+
+    @property
+    def lid_state(self) -> LidStateProvider:
+        if self._lid_state is None:
+            self._lid_state = self._owned_lid_state = get_lid_state_provider()
+        return self._lid_state
+
     @property
     def outputs(self) -> Dict[int, Output]:
         return self._outputs
 
-    def apply_config(self):
-        self._apply_to_outputs(list(self.get_connected_outputs()))
+    @property
+    def screen_size(self) -> ScreenSize:
+        return self._screen_size
+
+    def apply_config(self, grab: bool = False) -> CommitPlan:
+        if self._needs_probe():
+            self._discover(probe=True)
+        plan = self._plan_config()
+        try:
+            if grab:
+                plan = self._commit_with_grab(plan)
+            else:
+                self.commit(plan)
+        except ValueError:
+            self._forget_pending_layout()
+            raise
+        self._restore_plan = self._get_restore_plan(plan)
+        self._remember_layout()
+        return plan
+
+    def close(self):
+        # A lid state provider that was passed in belongs to the caller, only the one opened here is closed.
+        owned_lid_state = self._owned_lid_state
+        if owned_lid_state is not None:
+            owned_lid_state.close()
+            self._lid_state = self._owned_lid_state = None
+
+    def commit(self, plan: CommitPlan, rollback: bool = True) -> CommitResult:
+        self._baseline = self.crtcs, self.screen_size
+        with self._phase('commit'):
+            result = self.adapter.commit(plan)
+            rollback_plan = self._get_rollback_plan(result) if rollback else None
+            rollback_result = self.adapter.commit(rollback_plan) if rollback_plan is not None else None
+        self._track_commit(result, rollback_result)
+        self._check_commit(result, rollback_plan)
+        return result
 
     def get_active_outputs(self) -> Iterator[Output]:
         return filter(lambda output: output.is_connected and output.current_crtc != 0, self.outputs.values())
 
+    def get_connected_monitors(self) -> Tuple:
+        # The EDID is only read when the config identifies monitors, the modes a monitor offers tell a swap apart.
+        return tuple(sorted(
+            (
+                output.id,
+                output.name,
+                output.fingerprint or '',
+                tuple(mode.id for mode in output.modes if mode is not None),
+                output.num_preferred,
+                output.mm_width,
+                output.mm_height
+            )
+            for output in self.get_connected_outputs()
+        ))
+
     def get_connected_outputs(self) -> Iterator[Output]:
         return filter(lambda output: output.is_connected, self.outputs.values())
 
@@ -68,40 +189,16 @@ class ScreenManager:
             crtcs
         )
         if any(output.get('off_on_lid_close') for output in self._config.get('outputs').values()):
-            layout = LaptopLidLayoutDecorator(layout)
+            layout = LaptopLidLayoutDecorator(layout, self.lid_state)
         return layout
 
-    def reset(self):
-        adapter = self.adapter
-        resources = adapter.get_screen_resources()
-        crtcs = dict(self._parse_crtcs(resources.crtcs))
-        x, y = adapter.screen_size
-        x_mm, y_mm = adapter.screen_size_mm
-        for crtc in crtcs.values():
-            self._disable_crtc_if_does_not_fit_screen(crtc, x, y)
-        adapter.set_screen_size(x, y, x_mm, y_mm)
-        for crtc in self.crtcs.values():
-            adapter.set_crtc_config(
-                crtc.id,
-                crtc.x,
-                crtc.y,
-                crtc.mode,
-                crtc.rotation,
-                crtc.outputs
-            )
+    def get_plan(self, layout: LayoutInterface) -> CommitPlan:
+        targets, screen_size = self.get_targets(layout)
+        return CommitPlanner(self.crtcs, self.screen_size).plan(targets, screen_size)
 
-    def _apply_to_outputs(self, outputs: List[Output]):
-        adapter = self.adapter
-        layout = self.get_layout(outputs, self.crtcs)
-        layout.arrange()
-        x, y = layout.screen_size
-        x_mm, y_mm = layout.screen_size_mm
-        for crtc in self.crtcs.values():
-            self._disable_crtc_if_does_not_fit_screen(crtc, x, y)
-        adapter.set_screen_size(x, y, x_mm, y_mm)
-        arrangements = layout.arrangements
-        for arrangement in arrangements:
-            adapter.set_crtc_config(
+    def get_targets(self, layout: LayoutInterface) -> LayoutEntry:
+        targets = [
+            CrtcChange(
                 arrangement.crtc.id,
                 arrangement.x,
                 arrangement.y,
@@ -109,27 +206,188 @@ class ScreenManager:
                 arrangement.rotation,
                 [arrangement.output.id] if arrangement.output is not None else []
             )
+            for arrangement in layout.arrangements
+        ]
+        x, y = layout.screen_size
+        x_mm, y_mm = layout.screen_size_mm
+        return targets, ScreenSize(x, y, x_mm, y_mm)
+
+    def get_resource_snapshot(self) -> ResourceSnapshot:
+        return ResourceSnapshot(
+            self.config_timestamp,
+            self._timestamp,
+            self.screen_size,
+            list(self.available_modes.values()),
+            list(self.crtcs.values()),
+            [
+                OutputSnapshot(
+                    output.id,
+                    output.name,
+                    output.current_crtc,
+                    list(output.crtcs),
+                    [mode.id for mode in output.modes if mode is not None],
+                    output.connection,
+                    output.mm_width,
+                    output.mm_height,
+                    output.num_preferred,
+                    output.fingerprint
+                )
+                for output in self.outputs.values()
+            ]
+        )
+
+    def get_snapshot(self) -> ScreenSnapshot:
+        return ScreenSnapshot(
+            self.config_timestamp,
+            self.screen_size,
+            list(self.crtcs.values()),
+            self._restore_plan
+        )
 
-    def _disable_crtc(self, crtc_id: int):
+    def handle_event(self, event):
+        self._properties.handle_event(event)
+
+    def mark_stale(self):
+        self._is_stale = True
+
+    def refresh(self, probe: bool = False):
+        self._discover(probe)
+
+    def reset(self):
+        self._forget_layout()
+        restore_plan = self._restore_plan
+        if restore_plan is not None:
+            self.commit(restore_plan, rollback=False)
+            self._restore_plan = None
+        else:
+            self.restore(self._get_baseline_snapshot())
+
+    def restore(self, snapshot: ScreenSnapshot):
+        adapter = self.adapter
+        with self._phase('discovery'):
+            resources = adapter.get_screen_resources_current()
+            geometry = adapter.get_geometry(defer=True)
+            crtcs = dict(self._parse_crtcs(adapter.get_crtc_infos(resources.crtcs)))
+            geometry.reply()
+            screen_size = ScreenSize(geometry.width, geometry.height, *adapter.screen_size_mm)
+        self._available_modes = dict(self._parse_modes(resources.modes, resources.mode_names))
+        self._crtcs, self._screen_size = crtcs, screen_size
+        targets = [CrtcChange.from_crtc(crtc) for crtc in snapshot.crtcs]
+        self.commit(CommitPlanner(crtcs, screen_size).plan(targets, snapshot.screen_size), rollback=False)
+
+    def _check_commit(self, result: CommitResult, rollback_plan: Optional[CommitPlan]):
+        if result.is_successful:
+            return
+        rolled_back = ', the CRTCs that were configured have been rolled back' if rollback_plan is not None else ''
+        raise ValueError(f'Failed to configure {result.describe_failures()}{rolled_back}')
+
+    def _commit_with_grab(self, plan: CommitPlan) -> CommitPlan:
         adapter = self.adapter
-        adapter.set_crtc_config(
-            crtc_id,
-            0,
-            0,
-            0,
-            Rotate_0,
-            []
+        display = adapter.display
+        start = perf_counter()
+        display.grab_server()
+        try:
+            with self._phase('grab'):
+                resources = adapter.get_screen_resources_current()
+                # Another client may have changed the configuration since discovery, plan again against its changes.
+                if (resources.config_timestamp, resources.timestamp) != (self._config_timestamp, self._timestamp):
+                    self._discover(probe=False)
+                    plan = self._plan_config()
+                self.commit(plan)
+        finally:
+            display.ungrab_server()
+            display.flush()
+            self._grab_duration = perf_counter() - start
+        return plan
+
+    def _discover(self, probe: bool):
+        adapter = self.adapter
+        with self._phase('discovery'):
+            resources = adapter.get_screen_resources() if probe else adapter.get_screen_resources_current()
+            geometry = adapter.get_geometry(defer=True)
+            properties = self._request_properties(resources.outputs)
+            crtc_infos, output_infos = adapter.get_resource_infos(resources.crtcs, resources.outputs)
+            geometry.reply()
+            self._properties.store(properties)
+            self._load(resources, crtc_infos, output_infos, geometry, probe)
+
+    def _forget_layout(self):
+        # A layout that was reverted is not known to be good, it must not be replayed the next time.
+        if self._layout_key is not None:
+            self._layout_cache.discard(self._layout_key)
+            self._layout_key = None
+
+    def _forget_pending_layout(self):
+        key = self._pending_layout[0]
+        key is not None and self._layout_cache.discard(key)
+
+    def _get_baseline_snapshot(self) -> ScreenSnapshot:
+        # Without a restore plan the last apply failed, what it changed is reverted to the state before its commit.
+        crtcs, screen_size = self._baseline
+        return ScreenSnapshot(self.config_timestamp, screen_size, list(crtcs.values()), None)
+
+    def _get_layout_key(self) -> Tuple:
+        config = self._config
+        is_lid_closed = self.lid_state.is_closed if config.uses_lid_state else None
+        return config.digest, config.profile, self.get_connected_monitors(), is_lid_closed
+
+    def _get_rollback_plan(self, result: CommitResult) -> Optional[CommitPlan]:
+        if result.is_successful:
+            return None
+        # The failed changes never took effect, only the applied ones are reverted to the state before the commit.
+        rollback_plan = self._get_restore_plan(result.applied)
+        return rollback_plan if not rollback_plan.is_empty else None
+
+    def _get_restore_plan(self, plan: CommitPlan) -> CommitPlan:
+        crtcs, screen_size = self._baseline
+        predicted_crtcs = plan.predict_crtcs(crtcs, self.available_modes)
+        targets = [CrtcChange.from_crtc(crtc) for crtc in crtcs.values()]
+        return CommitPlanner(predicted_crtcs, plan.screen_size or screen_size).plan(targets, screen_size)
+
+    def _has_mode(self, output: Output, mode_id: int) -> bool:
+        return any(mode is not None and mode.id == mode_id for mode in output.modes)
+
+    def _has_missing_outputs(self) -> bool:
+        output_configs = self._config.get('outputs')
+        output_index = OutputIndex(self.get_connected_outputs())
+        return any(
+            output_index.find(output_configs.get(arrangement)) is None
+            for arrangement in self._config.get('layout').get('arrangements')
         )
 
-    def _disable_crtc_if_does_not_fit_screen(self, crtc: Crtc, x: int, y: int):
-        if crtc.mode != 0:
-            mode = self.available_modes.get(crtc.mode)
-            if crtc.x + mode.width > x or crtc.y + mode.height > y:
-                self._disable_crtc(crtc.id)
+    def _needs_probe(self) -> bool:
+        if self.is_stale:
+            return True
+        if self.is_probed:
+            return False
+        try:
+            self._select_profile()
+        except ValueError:
+            # The monitors of a profile may only be found once the hardware is probed.
+            return True
+        return self._has_missing_outputs()
+
+    def _load(
+            self,
+            resources: GetScreenResources,
+            crtc_infos: Dict[int, GetCrtcInfo],
+            output_infos: Dict[int, GetOutputInfo],
+            geometry: GetGeometry,
+            probe: bool
+    ):
+        self._config_timestamp = resources.config_timestamp
+        self._timestamp = resources.timestamp
+        self._available_modes = dict(self._parse_modes(resources.modes, resources.mode_names))
+        self._crtcs = dict(self._parse_crtcs(crtc_infos))
+        self._outputs = dict(self._parse_outputs(output_infos))
+        self._screen_size = ScreenSize(geometry.width, geometry.height, *self.adapter.screen_size_mm)
+        self._baseline = self._crtcs, self._screen_size
+        self._is_probed = probe
+        self._is_stale = False
+        self._restore_plan = None
 
-    def _parse_crtcs(self, crtcs: List[int]):
-        for crtc in crtcs:
-            info = self._adapter.get_crtc_info(crtc)
+    def _parse_crtcs(self, crtc_infos: Dict[int, GetCrtcInfo]):
+        for crtc, info in crtc_infos.items():
             yield crtc, Crtc(
                 crtc,
                 info.mode,
@@ -147,28 +405,77 @@ class ScreenManager:
         for mode in modes:
             name = mode_names[name_index: name_index + mode.name_length]
             name_index += mode.name_length
-            yield mode.id, Mode(
-                mode.id,
-                name,
-                mode.width,
-                mode.height,
-                mode.dot_clock,
-                mode.h_sync_start,
-                mode.h_sync_end,
-                mode.h_total,
-                mode.h_skew,
-                mode.v_sync_start,
-                mode.v_sync_end,
-                mode.v_total,
-                mode.name_length,
-                mode.flags
-            )
+            yield mode.id, Mode.from_info(mode, name)
 
-    def _parse_outputs(self, outputs: List[int]):
-        for output in outputs:
-            info = self._adapter.get_output_info(output)
+    def _parse_outputs(self, output_infos: Dict[int, GetOutputInfo]):
+        for output, info in output_infos.items():
+            fingerprint = self._properties.get(output, 'EDID')
             yield output, Output(
                 output,
                 info,
-                self._available_modes
+                self._available_modes,
+                str(fingerprint) if fingerprint is not None else None
+            )
+
+    def _phase(self, name: str):
+        profiler = self.adapter.profiler
+        return profiler.phase(name) if profiler is not None else nullcontext()
+
+    def _is_replayable(self, entry: LayoutEntry) -> bool:
+        # Resource ids are only stable while the X server runs, a layout from an earlier session is computed again.
+        targets, _ = entry
+        outputs = self.outputs
+        return all(
+            target.crtc in self.crtcs and (target.is_disabled or target.mode in self.available_modes) and all(
+                output in outputs and (target.is_disabled or self._has_mode(outputs[output], target.mode))
+                for output in target.outputs
             )
+            for target in targets
+        )
+
+    def _plan_config(self) -> CommitPlan:
+        with self._phase('layout'):
+            self._select_profile()
+            layout_cache = self._layout_cache
+            key = self._get_layout_key() if layout_cache is not None else None
+            entry = layout_cache.get(key, self._is_replayable) if key is not None else None
+            if entry is None:
+                layout = self.get_layout(list(self.get_connected_outputs()), self.crtcs)
+                layout.arrange()
+                entry = self.get_targets(layout)
+            targets, screen_size = entry
+            self._pending_layout = key, targets, screen_size
+            return CommitPlanner(self.crtcs, self.screen_size).plan(targets, screen_size)
+
+    def _remember_layout(self):
+        key, targets, screen_size = self._pending_layout
+        if key is not None:
+            self._layout_cache.put(key, targets, screen_size)
+        self._layout_key = key
+
+    def _request_properties(self, output_ids: List[int]) -> Dict[Tuple[int, str], GetOutputProperty]:
+        if self._config is not None and not self._config.uses_fingerprints:
+            return {}
+        # Queued with the output info requests, so identifying monitors adds no round trip to discovery. Without a
+        # config the monitors are identified anyway, the resources may be recorded or listed.
+        return self._properties.request(output_ids)
+
+    def _track_commit(self, result: CommitResult, rollback_result: Optional[CommitResult]):
+        if rollback_result is None:
+            # The resources are not discovered again after a commit, the changes that took effect are applied instead.
+            self._update_state(result.applied)
+        elif not rollback_result.is_successful:
+            self.mark_stale()
+
+    def _update_state(self, plan: CommitPlan):
+        self._crtcs = plan.predict_crtcs(self.crtcs, self.available_modes)
+        self._screen_size = plan.screen_size or self.screen_size
+        owners = {output: crtc.id for crtc in self._crtcs.values() if crtc.mode != 0 for output in crtc.outputs}
+        for output in self.outputs.values():
+            output.current_crtc = owners.get(output.id, 0)
+
+    def _select_profile(self):
+        config = self._config
+        config.has_profiles and config.select_profile(
+            output.fingerprint for output in self.get_connected_outputs() if output.fingerprint is not None
+        )
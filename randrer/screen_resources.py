@@ -1,6 +1,11 @@
-from typing import NamedTuple, List, Dict
+from re import compile
+from typing import NamedTuple, List, Dict, Tuple, Iterable, Optional, Union
 
-from Xlib.ext.randr import GetOutputInfo
+from Xlib.ext.randr import GetOutputInfo, DoubleScan, Interlace
+from Xlib.protocol.rq import DictWrapper
+
+
+_connector_pattern = compile(r'^(?P<type>[A-Za-z]+(?:-[A-Za-z]+)*)-?(?P<path>\d+(?:-\d+)*)$')
 
 
 class Mode(NamedTuple):
@@ -19,11 +24,56 @@ class Mode(NamedTuple):
     name_length: int
     flags: int
 
+    @classmethod
+    def from_info(cls, info: DictWrapper, name: str) -> 'Mode':
+        return cls(
+            info.id,
+            name,
+            info.width,
+            info.height,
+            info.dot_clock,
+            info.h_sync_start,
+            info.h_sync_end,
+            info.h_total,
+            info.h_skew,
+            info.v_sync_start,
+            info.v_sync_end,
+            info.v_total,
+            info.name_length,
+            info.flags
+        )
+
+    @property
+    def refresh(self) -> float:
+        v_total = self.v_total
+        if self.flags & DoubleScan:
+            v_total *= 2
+        if self.flags & Interlace:
+            v_total /= 2
+        if not self.h_total or not v_total:
+            return 0.0
+        return self.dot_clock / (self.h_total * v_total)
+
+
+class Connector(NamedTuple):
+    type: str
+    path: Tuple[int, ...]
+
+    @classmethod
+    def from_config(cls, output_type: str, number: Union[int, str]) -> 'Connector':
+        return cls(output_type, tuple(int(part) for part in str(number).split('-')))
+
 
 class Output:
     id: int
+    _connector: Optional[Connector]
+    _fingerprint: Optional[str]
     _name: str
     _modes: List[Mode]
+    _modes_by_id: Dict[int, Mode]
+    _modes_by_name: Dict[str, Mode]
+    _modes_by_refresh: Dict[Tuple[int, int, int], Mode]
+    _fastest_modes: Dict[Tuple[int, int], Mode]
     _current_crtc: int
     _crtcs: List[int]
     _mm_width: int
@@ -32,10 +82,19 @@ class Output:
     _connection: int
     _selected_mode: Mode
 
-    def __init__(self, output_id: int, info: GetOutputInfo, available_modes: Dict[int, Mode]):
+    def __init__(
+            self,
+            output_id: int,
+            info: GetOutputInfo,
+            available_modes: Dict[int, Mode],
+            fingerprint: str = None
+    ):
         self.id = output_id
         self._name = info.name
+        self._connector = self._parse_connector(info.name)
+        self._fingerprint = fingerprint
         self._modes = [available_modes.get(mode) for mode in info.modes]
+        self._index_modes()
         self._current_crtc = info.crtc
         self._crtcs = info.crtcs
         self._connection = info.connection
@@ -44,6 +103,14 @@ class Output:
         self._num_preferred = info.num_preferred
         self._selected_mode = None
 
+    @property
+    def connector(self) -> Optional[Connector]:
+        return self._connector
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        return self._fingerprint
+
     @property
     def name(self) -> str:
         return self._name
@@ -56,6 +123,10 @@ class Output:
     def current_crtc(self) -> int:
         return self._current_crtc
 
+    @current_crtc.setter
+    def current_crtc(self, crtc: int):
+        self._current_crtc = crtc
+
     @property
     def crtcs(self) -> List[int]:
         return self._crtcs
@@ -86,20 +157,96 @@ class Output:
     def is_connected(self) -> bool:
         return self.connection == 0
 
-    def get_mode_by_name(self, name: str) -> Mode:
-        for mode in self.modes:
-            if name == mode.name:
-                return mode
-        raise ValueError(f'No mode named {name}')
+    def get_mode_by_name(self, name: str, refresh: Union[float, str] = None) -> Mode:
+        if '@' in name:
+            name, refresh = name.split('@', 1)
+        mode = self._modes_by_name.get(name)
+        if mode is None:
+            raise ValueError(f'No mode named {name} for output {self.name}')
+        return self.get_mode_by_size(mode.width, mode.height, refresh) if refresh is not None else mode
+
+    def get_mode_by_size(self, width: int, height: int, refresh: Union[float, str] = None) -> Mode:
+        if refresh is None or refresh == 'max':
+            mode = self._fastest_modes.get((width, height))
+        else:
+            mode = self._modes_by_refresh.get((width, height, round(float(refresh))))
+        if mode is None:
+            refresh = f'@{refresh}' if refresh is not None else ''
+            raise ValueError(f'No mode {width}x{height}{refresh} for output {self.name}')
+        return mode
 
     def get_preferred_mode(self) -> Mode:
         return self.modes[self.num_preferred - 1]
 
     def set_mode(self, mode: Mode):
-        if mode not in self.modes:
+        if mode is None or self._modes_by_id.get(mode.id) != mode:
             raise ValueError(f'Invalid mode for output {self.name}')
         self._selected_mode = mode
 
+    def _index_modes(self):
+        self._modes_by_id = {}
+        self._modes_by_name = {}
+        self._modes_by_refresh = {}
+        self._fastest_modes = {}
+        for mode in self._modes:
+            if mode is None:
+                continue
+            refresh = mode.refresh
+            size = mode.width, mode.height
+            self._modes_by_id[mode.id] = mode
+            self._modes_by_name.setdefault(mode.name, mode)
+            self._modes_by_refresh.setdefault((*size, round(refresh)), mode)
+            fastest = self._fastest_modes.get(size)
+            if fastest is None or refresh > fastest.refresh:
+                self._fastest_modes[size] = mode
+
+    @staticmethod
+    def _parse_connector(name: str) -> Optional[Connector]:
+        match = _connector_pattern.match(name)
+        if match is None:
+            return None
+        return Connector(match.group('type'), tuple(int(part) for part in match.group('path').split('-')))
+
+
+class OutputIndex:
+    _by_connector: Dict[Connector, Output]
+    _by_fingerprint: Dict[str, Output]
+    _by_name: Dict[str, Output]
+    _by_path: Dict[Tuple[int, ...], List[Output]]
+
+    def __init__(self, outputs: Iterable[Output]):
+        self._by_connector = {}
+        self._by_fingerprint = {}
+        self._by_name = {}
+        self._by_path = {}
+        for output in outputs:
+            self._by_name[output.name] = output
+            if output.fingerprint is not None:
+                self._by_fingerprint[output.fingerprint] = output
+            if output.connector is not None:
+                self._by_connector[output.connector] = output
+                self._by_path.setdefault(output.connector.path, []).append(output)
+
+    def find(self, output_config: Dict) -> Optional[Output]:
+        if 'name' in output_config:
+            return self._by_name.get(output_config.get('name'))
+        if 'fingerprint' in output_config:
+            return self._by_fingerprint.get(output_config.get('fingerprint'))
+        connector = Connector.from_config(output_config.get('type'), output_config.get('number'))
+        output = self._by_connector.get(connector)
+        if output is None:
+            candidates = [
+                candidate for candidate in self._by_path.get(connector.path, [])
+                if candidate.connector.type.startswith(connector.type)
+            ]
+            if len(candidates) > 1:
+                raise ValueError(
+                    f'Ambiguous configuration for output {connector.type}-{output_config.get("number")}, matches '
+                    f'{", ".join(candidate.name for candidate in candidates)}'
+                )
+            output = candidates[0] if candidates else None
+        return output
+
 
 class Crtc(NamedTuple):
     id: int
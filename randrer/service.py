@@ -0,0 +1,175 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from json import dumps, loads
+from os import chdir, getcwd, unlink
+from select import select
+from socket import socket, AF_UNIX, SOCK_STREAM
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
+
+from randrer.client.connection import DisplayConnection
+from randrer.paths import get_display_key, get_runtime_directory
+
+if TYPE_CHECKING:
+    from randrer.client.client import Client
+    from randrer.screen import ScreenManager
+    from randrer.snapshot import ResourceSnapshotStore
+
+
+REFUSED = 75
+
+
+class RequestRefusedError(Exception):
+    pass
+
+
+def get_control_socket_location(display: str = None) -> str:
+    return f'{get_runtime_directory()}/control-{get_display_key(display)}.sock'
+
+
+class ControlService:
+    request_timeout: float = 5.0
+    _client_factory: Callable[[DisplayConnection], 'Client']
+    _connection: DisplayConnection
+    _resource_store: Optional['ResourceSnapshotStore']
+    _screen_manager: Optional['ScreenManager']
+    _socket_location: str
+
+    def __init__(
+            self,
+            connection: DisplayConnection,
+            client_factory: Callable[[DisplayConnection], 'Client'],
+            socket_location: str = None
+    ):
+        self._client_factory = client_factory
+        self._connection = connection
+        self._resource_store = None
+        self._screen_manager = None
+        self._socket_location = socket_location or get_control_socket_location(connection.name)
+
+    @property
+    def screen_manager(self) -> Optional['ScreenManager']:
+        return self._screen_manager
+
+    @property
+    def socket_location(self) -> str:
+        return self._socket_location
+
+    def handle(self, arguments: List[str], cwd: str) -> Tuple[int, str, str]:
+        output = StringIO()
+        errors = StringIO()
+        status = 0
+        previous_cwd = getcwd()
+        try:
+            # Relative locations in the arguments are relative to the caller's working directory.
+            chdir(cwd)
+            with redirect_stdout(output), redirect_stderr(errors):
+                self._client_factory(self._connection).run(arguments)
+        except RequestRefusedError as e:
+            # The caller runs the command itself instead.
+            status = REFUSED
+            errors.write(f'{e}\n')
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+            isinstance(e.code, str) and errors.write(f'{e.code}\n')
+        except Exception as e:
+            status = 1
+            errors.write(f'{e}\n')
+        finally:
+            chdir(previous_cwd)
+        return status, output.getvalue(), errors.getvalue()
+
+    def run(self):
+        # Only the service itself needs Xlib, the callers forwarding to it stay cheap to start.
+        from Xlib.ext.randr import RRScreenChangeNotifyMask, RRCrtcChangeNotifyMask, RROutputChangeNotifyMask, \
+            RROutputPropertyNotifyMask
+        from randrer.layout_cache import LayoutCache
+        from randrer.screen import ScreenManager
+        from randrer.snapshot import ResourceSnapshotStore, get_resource_snapshot_location
+        adapter = self._connection.adapter
+        display = adapter.display
+        adapter.select_input(
+            RRScreenChangeNotifyMask | RRCrtcChangeNotifyMask | RROutputChangeNotifyMask | RROutputPropertyNotifyMask
+        )
+        self._resource_store = ResourceSnapshotStore(get_resource_snapshot_location(self._connection.name))
+        self._screen_manager = ScreenManager(adapter, None, layout_cache=LayoutCache(display=self._connection.name))
+        # The operations run for the callers reuse the resources the events keep current instead of discovering them.
+        self._connection.screen_manager = self._screen_manager
+        listener = self._listen()
+        try:
+            self._save_resources()
+            while True:
+                # Requests read the replies they wait for, events that arrive with them are already queued.
+                if self._receive_events():
+                    self._screen_manager.refresh()
+                    self._save_resources()
+                    continue
+                readable = select([listener, display], [], [])[0]
+                if listener in readable:
+                    self._serve(listener)
+        finally:
+            self._connection.screen_manager = None
+            listener.close()
+            self._unlink(self._socket_location)
+            self._unlink(self._resource_store.location)
+
+    def _listen(self) -> socket:
+        location = self._socket_location
+        self._unlink(location)
+        listener = socket(AF_UNIX, SOCK_STREAM)
+        listener.bind(location)
+        listener.listen()
+        return listener
+
+    def _receive_events(self) -> bool:
+        display = self._connection.display
+        screen_manager = self._screen_manager
+        is_received = False
+        while display.pending_events():
+            screen_manager.handle_event(display.next_event())
+            is_received = True
+        return is_received
+
+    def _save_resources(self):
+        self._resource_store.save(self._screen_manager.get_resource_snapshot())
+
+    def _serve(self, listener: socket):
+        connection, _ = listener.accept()
+        with connection:
+            connection.settimeout(self.request_timeout)
+            try:
+                request = loads(_receive(connection))
+                status, output, errors = self.handle(request.get('arguments'), request.get('cwd'))
+            except (OSError, ValueError, TypeError) as e:
+                status, output, errors = 1, '', f'Invalid request, {e}\n'
+            try:
+                connection.sendall(dumps({'status': status, 'output': output, 'errors': errors}).encode())
+            except OSError:
+                pass
+
+    def _unlink(self, location: str):
+        try:
+            unlink(location)
+        except FileNotFoundError:
+            pass
+
+
+def send_request(arguments: List[str], socket_location: str = None, timeout: float = 60.0) -> Tuple[int, str, str]:
+    client = socket(AF_UNIX, SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_location or get_control_socket_location())
+        client.sendall(dumps({'arguments': arguments, 'cwd': getcwd()}).encode())
+        client.shutdown(1)
+        response = loads(_receive(client))
+    finally:
+        client.close()
+    return response.get('status'), response.get('output'), response.get('errors')
+
+
+def _receive(connection: socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
@@ -0,0 +1,146 @@
+from json import dump, load
+from os import environ, makedirs, replace
+from os.path import dirname
+from pathlib import Path
+from typing import NamedTuple, List, Optional, Dict
+
+from randrer.paths import get_display_key, get_runtime_directory
+from randrer.plan import CommitPlan, CrtcChange, ScreenSize
+from randrer.screen_resources import Crtc, Mode
+
+
+class ScreenSnapshot(NamedTuple):
+    config_timestamp: int
+    screen_size: ScreenSize
+    crtcs: List[Crtc]
+    restore_plan: Optional[CommitPlan]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ScreenSnapshot':
+        restore_plan = data.get('restore_plan')
+        if restore_plan is not None:
+            screen_size = restore_plan.get('screen_size')
+            restore_plan = CommitPlan(
+                [CrtcChange(*change) for change in restore_plan.get('disable')],
+                ScreenSize(*screen_size) if screen_size is not None else None,
+                [CrtcChange(*change) for change in restore_plan.get('configure')]
+            )
+        return cls(
+            data.get('config_timestamp'),
+            ScreenSize(*data.get('screen_size')),
+            [Crtc(*crtc) for crtc in data.get('crtcs')],
+            restore_plan
+        )
+
+    def to_dict(self) -> Dict:
+        restore_plan = self.restore_plan
+        return {
+            'version': 1,
+            'config_timestamp': self.config_timestamp,
+            'screen_size': list(self.screen_size),
+            'crtcs': [list(crtc) for crtc in self.crtcs],
+            'restore_plan': {
+                'disable': [list(change) for change in restore_plan.disable],
+                'screen_size': list(restore_plan.screen_size) if restore_plan.screen_size is not None else None,
+                'configure': [list(change) for change in restore_plan.configure]
+            } if restore_plan is not None else None
+        }
+
+
+class OutputSnapshot(NamedTuple):
+    id: int
+    name: str
+    crtc: int
+    crtcs: List[int]
+    modes: List[int]
+    connection: int
+    mm_width: int
+    mm_height: int
+    num_preferred: int
+    fingerprint: Optional[str]
+
+
+class ResourceSnapshot(NamedTuple):
+    config_timestamp: int
+    timestamp: int
+    screen_size: ScreenSize
+    modes: List[Mode]
+    crtcs: List[Crtc]
+    outputs: List[OutputSnapshot]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ResourceSnapshot':
+        return cls(
+            data.get('config_timestamp'),
+            data.get('timestamp'),
+            ScreenSize(*data.get('screen_size')),
+            [Mode(*mode) for mode in data.get('modes')],
+            [Crtc(*crtc) for crtc in data.get('crtcs')],
+            [OutputSnapshot(*output) for output in data.get('outputs')]
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': 1,
+            'config_timestamp': self.config_timestamp,
+            'timestamp': self.timestamp,
+            'screen_size': list(self.screen_size),
+            'modes': [list(mode) for mode in self.modes],
+            'crtcs': [list(crtc) for crtc in self.crtcs],
+            'outputs': [list(output) for output in self.outputs]
+        }
+
+
+def get_resource_snapshot_location(display: str = None) -> str:
+    return f'{get_runtime_directory()}/resources-{get_display_key(display)}.json'
+
+
+class ResourceSnapshotStore:
+    def __init__(self, location: str):
+        self._location = location
+
+    @property
+    def location(self) -> str:
+        return self._location
+
+    def load(self) -> ResourceSnapshot:
+        location = self._location
+        try:
+            with open(location, 'r') as file_handle:
+                return ResourceSnapshot.from_dict(load(file_handle))
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No resource snapshot was found at {location}') from None
+
+    def save(self, snapshot: ResourceSnapshot):
+        location = self._location
+        dirname(location) and makedirs(dirname(location), mode=0o700, exist_ok=True)
+        temporary_location = f'{location}.tmp'
+        with open(temporary_location, 'w') as file_handle:
+            dump(snapshot.to_dict(), file_handle, separators=(',', ':'))
+        replace(temporary_location, location)
+
+
+class SnapshotStore:
+    def __init__(self, location: str = None, display: str = None):
+        state_home = environ.get('XDG_STATE_HOME') or f'{Path.home()}/.local/state'
+        self._location = location or f'{state_home}/randrer/snapshot-{get_display_key(display)}.json'
+
+    @property
+    def location(self) -> str:
+        return self._location
+
+    def load(self) -> ScreenSnapshot:
+        location = self._location
+        try:
+            with open(location, 'r') as file_handle:
+                return ScreenSnapshot.from_dict(load(file_handle))
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No snapshot was found at {location}') from None
+
+    def save(self, snapshot: ScreenSnapshot):
+        location = self._location
+        makedirs(dirname(location), exist_ok=True)
+        temporary_location = f'{location}.tmp'
+        with open(temporary_location, 'w') as file_handle:
+            dump(snapshot.to_dict(), file_handle, separators=(',', ':'))
+        replace(temporary_location, location)
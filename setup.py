@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='randrer',
     version='0.2.4',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'tests']),
     entry_points={
         'console_scripts': [
             'randrer = randrer.client.client:main'
@@ -0,0 +1,51 @@
+from os import environ, getcwd
+from os.path import exists
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from randrer.client.client import create_client
+from randrer.client.connection import DisplayConnection
+from randrer.fake_adapter import FakeRandrAdapter, FakeTopology
+from randrer.service import REFUSED, ControlService, send_request
+
+
+class ControlServiceTest(TestCase):
+    def setUp(self):
+        runtime_directory = TemporaryDirectory()
+        self.addCleanup(runtime_directory.cleanup)
+        environment = patch.dict(environ, {'DISPLAY': ':0', 'XDG_RUNTIME_DIR': runtime_directory.name})
+        environment.start()
+        self.addCleanup(environment.stop)
+        adapter = FakeRandrAdapter(FakeTopology.generate(2))
+        self.connection = DisplayConnection()
+        self.connection._adapter = adapter
+        self.connection._display = adapter.display
+        self.service = ControlService(
+            self.connection,
+            lambda connection: create_client(connection, use_service=False, is_forwarded=True)
+        )
+
+    def test_forwards_the_display_it_is_connected_to(self):
+        status, output, errors = self.service.handle(['--display', ':0', 'get-outputs'], getcwd())
+        self.assertEqual((0, 'eDP-1\n', ''), (status, output, errors))
+
+    def test_refuses_another_screen(self):
+        status, _, _ = self.service.handle(['--display', ':0.1', 'get-outputs'], getcwd())
+        self.assertEqual(REFUSED, status)
+
+    def test_refuses_another_screen_over_the_socket(self):
+        Thread(target=self.service.run, daemon=True).start()
+        while not exists(self.service.socket_location):
+            sleep(0.01)
+        self.assertEqual(0, send_request(['--display', ':0', 'get-outputs'], self.service.socket_location)[0])
+        self.assertEqual(
+            REFUSED,
+            send_request(['--display', ':0.1', 'get-outputs'], self.service.socket_location)[0]
+        )
+
+
+if __name__ == '__main__':
+    main()